@@ -0,0 +1,2 @@
+# -*- coding:utf-8 -*-
+# 性能测试脚本，统一使用unittest配置的数据库，运行方式：python -m benchmarks.<脚本名>
@@ -0,0 +1,104 @@
+# -*- coding:utf-8 -*-
+"""下单接口的并发压力测试
+1.多个用户同时预订同一房屋有重叠的日期，检查每一轮只有一个请求预订成功，订单表中也没有重叠的订单
+2.多个用户同时预订不同的房屋，检查全部预订成功，并统计吞吐量
+需要使用支持行锁的数据库(MySQL InnoDB)运行
+运行方式：python -m benchmarks.booking_stress
+"""
+
+
+import sys
+import json
+import time
+import threading
+import datetime
+from iHome import get_app, db
+from iHome.models import Order
+from iHome.utils.response_code import RET
+from benchmarks import seed
+from benchmarks.query_count import login
+
+
+USER_COUNT = 200
+HOUSE_COUNT = 2000
+# 同时下单的线程数
+THREADS = 20
+# 同一房屋冲突预订的轮数
+CONFLICT_ROUNDS = 20
+
+
+def book_concurrently(bookings):
+    """每个线程使用自己的客户端同时发出一个下单请求，返回每个请求的errno"""
+    clients = []
+    for user_id, _ in bookings:
+        client = app.test_client()
+        login(client, user_id)
+        clients.append(client)
+
+    barrier = threading.Event()
+    results = [None] * len(bookings)
+
+    def book(index):
+        barrier.wait()
+        response = clients[index].post('/api/1.0/orders', data=json.dumps(bookings[index][1]),
+                                       content_type='application/json')
+        results[index] = json.loads(response.data)['errno']
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(len(bookings))]
+    for thread in threads:
+        thread.start()
+    barrier.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def overlapping_orders(house_id):
+    """房屋的有效订单中日期重叠的订单对数"""
+    orders = Order.query.filter(Order.house_id == house_id, Order.status.notin_(Order.RELEASED_STATUSES)) \
+        .order_by(Order.begin_date).all()
+    db.session.remove()
+    return sum(1 for a, b in zip(orders, orders[1:]) if b.begin_date < a.end_date)
+
+
+def main():
+    seed.reset_database()
+    seed.seed_base(user_count=USER_COUNT, house_count=HOUSE_COUNT)
+    db.session.remove()
+
+    # 1.同一房屋的冲突预订：每一轮的日期都互相重叠
+    failures = 0
+    for round_index in range(CONFLICT_ROUNDS):
+        house_id = round_index + 1
+        start_date = datetime.date(2019, 1, 10)
+        bookings = []
+        for i in range(THREADS):
+            begin = start_date + datetime.timedelta(days=i % 3)
+            bookings.append((i + 1, {'house_id': house_id, 'start_date': begin.strftime('%Y-%m-%d'),
+                                     'end_date': (begin + datetime.timedelta(days=3)).strftime('%Y-%m-%d')}))
+        results = book_concurrently(bookings)
+        winners = results.count(RET.OK)
+        overlaps = overlapping_orders(house_id)
+        if winners != 1 or overlaps:
+            failures += 1
+            print('round %d: %d bookings succeeded, %d overlapping orders' % (round_index, winners, overlaps))
+    print('conflict rounds: %d, failed: %d' % (CONFLICT_ROUNDS, failures))
+
+    # 2.不同房屋的预订：互不影响，全部成功
+    bookings = [(i + 1, {'house_id': CONFLICT_ROUNDS + i + 1, 'start_date': '2019-02-01', 'end_date': '2019-02-05'})
+                for i in range(THREADS * 5)]
+    begin = time.time()
+    results = book_concurrently(bookings)
+    cost = time.time() - begin
+    succeeded = results.count(RET.OK)
+    print('parallel bookings: %d/%d succeeded, %.0f orders/s' % (succeeded, len(bookings), len(bookings) / cost))
+    if succeeded != len(bookings):
+        failures += 1
+
+    return 0 if failures == 0 else 1
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+"""缓存命中时的响应耗时：解码后重新编码与直接返回序列化好的JSON的对比
+before: 以前的做法，缓存中保存str()的结果，命中时eval得到Python对象，再由jsonify重新编码
+after: 现在的接口，缓存中保存序列化好的JSON，命中时直接拼接到响应中
+分别对城区列表和房屋搜索统计p50和p99，缓存都已经预热，只统计命中时的耗时，并检查两种响应的内容相同
+运行方式：python -m benchmarks.cache_hit
+"""
+
+
+import sys
+import json
+import logging
+import time
+import random
+from flask import jsonify
+import iHome
+from iHome import get_app, db, constants
+from iHome.api_1_0.house import get_areas, get_houses_search
+from iHome.utils import listing_index
+from iHome.utils.response_code import RET
+from benchmarks import seed
+from benchmarks.search_availability import percentile
+
+
+AREA_COUNT = 20
+USER_COUNT = 200
+HOUSE_COUNT = 2000
+REPEAT = 2000
+# 搜索结果每页的房屋数量，使用接近实际页面的数量，而不是默认的每页2条
+PAGE_CAPACITY = 20
+
+LEGACY_AREAS_KEY = 'bench_legacy_areas'
+LEGACY_SEARCH_KEY = 'bench_legacy_search'
+SEARCH_URL = '/api/1.0/houses/search?aid=1&sk=new&p=1'
+
+
+def legacy_areas():
+    return jsonify(errno=RET.OK, errmsg='OK', data=eval(iHome.redis_store.get(LEGACY_AREAS_KEY)))
+
+
+def legacy_search():
+    return jsonify(errno=RET.OK, errmsg='OK', data=eval(iHome.redis_store.get(LEGACY_SEARCH_KEY)))
+
+
+def measure(view, url):
+    """在请求上下文中调用视图函数并取出响应体，返回排好序的耗时(毫秒)和最后一次的响应体"""
+    costs = []
+    body = None
+    for _ in range(REPEAT):
+        with app.test_request_context(url):
+            begin = time.time()
+            body = view().get_data()
+            costs.append((time.time() - begin) * 1000)
+    return sorted(costs), body
+
+
+def main():
+    # 调试模式下接口会输出调试日志，不统计日志的耗时
+    app.logger.setLevel(logging.WARN)
+    constants.HOUSE_LIST_PAGE_CAPACITY = PAGE_CAPACITY
+    seed.reset_database()
+    seed.seed_base(AREA_COUNT, USER_COUNT, HOUSE_COUNT, random.Random(0))
+    listing_index.rebuild()
+    db.session.remove()
+
+    # 预热缓存，并按以前的格式写入同样的数据
+    client = app.test_client()
+    areas_response = client.get('/api/1.0/areas')
+    search_response = client.get(SEARCH_URL)
+    iHome.redis_store.set(LEGACY_AREAS_KEY, str(areas_response.json['data']))
+    iHome.redis_store.set(LEGACY_SEARCH_KEY, str(search_response.json['data']))
+
+    results = [
+        ('areas', measure(legacy_areas, '/api/1.0/areas'), measure(get_areas, '/api/1.0/areas')),
+        ('search', measure(legacy_search, SEARCH_URL), measure(get_houses_search, SEARCH_URL)),
+    ]
+
+    print('%-8s %-8s %12s %12s %10s' % ('', '', 'p50(ms)', 'p99(ms)', 'bytes'))
+    same = True
+    for name, (before_costs, before_body), (after_costs, after_body) in results:
+        print('%-8s %-8s %12.3f %12.3f %10d' % (name, 'before', percentile(before_costs, 0.5),
+                                                 percentile(before_costs, 0.99), len(before_body)))
+        print('%-8s %-8s %12.3f %12.3f %10d' % (name, 'after', percentile(after_costs, 0.5),
+                                                 percentile(after_costs, 0.99), len(after_body)))
+        if json.loads(before_body) != json.loads(after_body):
+            print('%s: responses differ' % name)
+            same = False
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
@@ -0,0 +1,87 @@
+# -*- coding:utf-8 -*-
+"""列表数据的生成：ORM实体与Core查询结果行的对比
+分别使用ORM(创建House/Order对象后调用to_*_dict)和iHome.utils.read_queries(Core select得到结果行)
+查询并生成1000条房屋卡片和1000条订单的数据，统计每1000行的耗时p50和p99，并检查两种方式生成的数据完全相同
+运行方式：python -m benchmarks.core_rows
+"""
+
+
+import sys
+import time
+import random
+from iHome import get_app, db
+from iHome.models import House, Order
+from iHome.utils import read_queries
+from benchmarks import seed
+from benchmarks.search_availability import percentile
+
+
+AREA_COUNT = 20
+USER_COUNT = 200
+HOUSE_COUNT = 20000
+ORDER_COUNT = 100000
+ROW_COUNT = 1000
+REPEAT = 50
+
+
+def orm_houses(house_ids):
+    houses = House.query.filter(House.id.in_(house_ids)) \
+        .options(db.joinedload(House.area), db.joinedload(House.user)).all()
+    return dict((house.id, house.to_basic_dict()) for house in houses)
+
+
+def core_houses(house_ids):
+    return read_queries.house_cards(house_ids)
+
+
+def orm_orders(min_order_id):
+    orders = Order.query.join(House, Order.house_id == House.id).filter(Order.id >= min_order_id) \
+        .options(db.contains_eager(Order.house)).order_by(Order.id.desc()).limit(ROW_COUNT).all()
+    return [order.to_dict() for order in orders]
+
+
+def core_orders(min_order_id):
+    return read_queries.order_dicts(read_queries.order_rows(Order.id >= min_order_id, limit=ROW_COUNT))
+
+
+def measure(load, params):
+    """依次执行查询，返回每次的耗时(毫秒)和生成的数据，每次使用新的会话，不复用identity map中的对象"""
+    costs = []
+    results = []
+    for param in params:
+        begin = time.time()
+        results.append(load(param))
+        costs.append((time.time() - begin) * 1000)
+        db.session.remove()
+    return sorted(costs), results
+
+
+def main():
+    rnd = random.Random(0)
+    seed.reset_database()
+    seed.seed_base(AREA_COUNT, USER_COUNT, HOUSE_COUNT, rnd)
+    seed.seed_orders(ORDER_COUNT, USER_COUNT, HOUSE_COUNT, rnd)
+    db.session.remove()
+
+    house_params = [rnd.sample(range(1, HOUSE_COUNT + 1), ROW_COUNT) for _ in range(REPEAT)]
+    order_params = [rnd.randint(1, ORDER_COUNT - ROW_COUNT) for _ in range(REPEAT)]
+    results = [
+        ('houses', measure(orm_houses, house_params), measure(core_houses, house_params)),
+        ('orders', measure(orm_orders, order_params), measure(core_orders, order_params)),
+    ]
+
+    print('%-8s %-6s %16s %16s' % ('', '', 'p50(ms/1000)', 'p99(ms/1000)'))
+    same = True
+    for name, (orm_costs, orm_results), (core_costs, core_results) in results:
+        print('%-8s %-6s %16.2f %16.2f' % (name, 'orm', percentile(orm_costs, 0.5), percentile(orm_costs, 0.99)))
+        print('%-8s %-6s %16.2f %16.2f' % (name, 'core', percentile(core_costs, 0.5), percentile(core_costs, 0.99)))
+        if orm_results != core_results:
+            print('%s: results differ' % name)
+            same = False
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
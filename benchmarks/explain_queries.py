@@ -0,0 +1,123 @@
+# -*- coding:utf-8 -*-
+"""检查热点查询的执行计划
+在填充好数据的unittest数据库上对每种查询执行EXPLAIN，出现全表扫描(type=ALL)或者按主键顺序扫描整个索引
+(type=index, key=PRIMARY，例如ORDER BY id DESC LIMIT没有用上筛选条件的索引)时以非0状态退出
+查询语句由视图使用的函数(read_queries.order_select、house_page_query等)生成，视图的查询变化后这里同步变化
+运行方式：python -m benchmarks.explain_queries
+"""
+
+
+import sys
+import datetime
+from iHome import get_app, db, constants
+from iHome.models import House, Order
+from iHome.utils import facets, read_queries, search_index
+from iHome.api_1_0.house import HOUSE_LIST_SORTS, house_page_query, latest_comment_order_ids
+from benchmarks import seed
+
+
+ORDER_COUNT = 100000
+
+
+def query_shapes():
+    """与视图函数中查询条件、排序方式一致的查询"""
+    aid = 1
+    user_id = 1
+    house_id = 1
+    start_date = datetime.datetime(2018, 5, 1)
+    end_date = datetime.datetime(2018, 5, 4)
+
+    # get_houses_search: 房屋列表索引不能使用时的数据库查询，各种排序方式，页码分页和游标分页，只查询编号和排序值
+    search_queries = [
+        ('aid', House.query.filter(House.area_id == aid)),
+        ('all areas', House.query),
+        ('aid+dates', House.query.filter(House.area_id == aid, House.available_filter(start_date, end_date))),
+        ('aid+filters', facets.apply_filters(House.query.filter(House.area_id == aid),
+                                             {'min_price': 10000, 'facility_mask': facets.facility_mask([1, 3])})),
+        ('aid+keyword ids', House.query.filter(House.area_id == aid, House.id.in_([1, 2, 3]))),
+        ('aid+keyword like', House.query.filter(House.area_id == aid, search_index.keyword_filter([u'房']))),
+    ]
+    shapes = []
+    for name, house_query in search_queries:
+        for sk in sorted(HOUSE_LIST_SORTS):
+            shapes.append(('search %s sk=%s' % (name, sk), house_page_query(house_query, sk, 2, None)))
+            last_value = start_date if sk == 'new' else 100
+            shapes.append(('search %s sk=%s cursor' % (name, sk),
+                           house_page_query(house_query, sk, 1, (last_value, 100))))
+
+    # get_order_list: 订单关联房屋、按订单编号倒序分页，可选的状态筛选和游标，第一页按状态分组统计
+    order_filters = [
+        ('role=custom', Order.user_id == user_id),
+        ('role=landlord', House.user_id == user_id),
+    ]
+    for name, order_filter in order_filters:
+        shapes += [
+            ('orders %s' % name, read_queries.order_select(order_filter, limit=constants.ORDER_LIST_PAGE_CAPACITY + 1)),
+            ('orders %s status' % name,
+             read_queries.order_select(db.and_(order_filter, Order.status == 'COMPLETE'),
+                                       limit=constants.ORDER_LIST_PAGE_CAPACITY + 1)),
+            ('orders %s cursor' % name,
+             read_queries.order_select(db.and_(order_filter, Order.id < ORDER_COUNT // 2),
+                                       limit=constants.ORDER_LIST_PAGE_CAPACITY + 1)),
+            ('orders %s counts' % name, read_queries.order_status_select(order_filter)),
+        ]
+
+    shapes += [
+        # get_house_index
+        ('index', db.session.query(House.id).order_by(House.create_time.desc())
+         .limit(constants.HOME_PAGE_MAX_HOUSES)),
+        # get_house_detail: 每个房屋最新的几条评论
+        ('detail comments', db.select([latest_comment_order_ids([1, 2, 3]).c.id])),
+        # create_order
+        ('create_order conflicts', Order.query.filter(Order.house_id == house_id, end_date > Order.begin_date,
+                                                      start_date < Order.end_date,
+                                                      Order.status.notin_(Order.RELEASED_STATUSES))),
+        # get_user_houses
+        ('user houses', db.session.query(House.id).filter(House.user_id == user_id)),
+    ]
+    return shapes
+
+
+def explain(query):
+    """返回查询的执行计划：[(表名, 访问类型, 使用的索引), ...]，query可以是ORM查询或者Core的select"""
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().execute('EXPLAIN ' + compiled.string, params)
+    return [(row['table'], row['type'], row['key']) for row in rows]
+
+
+def full_scan(table, access_type, key):
+    """全表扫描，或者按主键顺序扫描整个索引
+    <derivedN>、<unionN,M>是子查询的临时结果，行数受子查询的LIMIT限制，不算全表扫描
+    """
+    if table and table.startswith('<'):
+        return False
+    return access_type == 'ALL' or (access_type == 'index' and key == 'PRIMARY')
+
+
+def main():
+    seed.reset_database()
+    seed.seed_base()
+    seed.seed_orders(ORDER_COUNT)
+    # 更新统计信息，让优化器基于真实的数据分布选择索引
+    db.session.execute('ANALYZE TABLE ih_house_info, ih_order_info')
+
+    failures = []
+    for name, query in query_shapes():
+        for table, access_type, key in explain(query):
+            status = 'FAIL' if full_scan(table, access_type, key) else 'ok'
+            print('%-4s %-40s %-16s %-8s %s' % (status, name, table, access_type, key))
+            if full_scan(table, access_type, key):
+                failures.append(name)
+
+    if failures:
+        print('full table scan: %s' % ', '.join(sorted(set(failures))))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
@@ -0,0 +1,48 @@
+# -*- coding:utf-8 -*-
+"""首页房屋数据的压力测试
+预先生成首页数据和房屋卡片后连续请求首页接口，统计响应时间，并检查请求过程中没有执行任何SQL
+运行方式：python -m benchmarks.house_index
+"""
+
+
+import sys
+import json
+import time
+from iHome import get_app
+from iHome.api_1_0.house import load_house_index
+from iHome.utils.response_code import RET
+from benchmarks import seed
+from benchmarks.query_count import QueryCounter
+
+
+REQUESTS = 2000
+
+
+def main():
+    seed.reset_database()
+    seed.seed_base()
+
+    # 发布房源时会重新生成首页数据，这里直接生成，再请求一次生成房屋卡片
+    load_house_index.refresh()
+    client = app.test_client()
+    client.get('/api/1.0/houses/index')
+
+    costs = []
+    with QueryCounter() as counter:
+        for _ in range(REQUESTS):
+            begin = time.time()
+            response = client.get('/api/1.0/houses/index')
+            costs.append((time.time() - begin) * 1000)
+            assert json.loads(response.data)['errno'] == RET.OK
+    costs.sort()
+
+    print('requests=%d p50=%.3fms p99=%.3fms qps=%.0f queries=%d' % (
+        REQUESTS, costs[len(costs) // 2], costs[int(len(costs) * 0.99)], REQUESTS / (sum(costs) / 1000),
+        counter.count))
+    return 0 if counter.count == 0 else 1
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
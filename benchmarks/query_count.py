@@ -0,0 +1,120 @@
+# -*- coding:utf-8 -*-
+"""检查列表接口每次请求执行的SQL数量
+接口执行的SQL数量应该是固定的，不随返回的数据条数增加，超过预期数量时以非0状态退出
+运行方式：python -m benchmarks.query_count
+"""
+
+
+import sys
+import json
+from sqlalchemy import event
+import iHome
+from iHome import get_app, db
+from iHome.models import House, Order
+from iHome.utils.response_code import RET
+from benchmarks import seed
+
+
+class QueryCounter(object):
+    """统计代码块中执行的SQL语句"""
+
+    def __init__(self):
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event.remove(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def login(client, user_id):
+    """将用户的登录状态写入测试客户端的session"""
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+
+def count_request_queries(client, url):
+    """清空缓存后请求接口，返回请求过程中执行的SQL语句"""
+    iHome.redis_store.flushdb()
+    db.session.remove()
+    with QueryCounter() as counter:
+        response = client.get(url)
+    response_dict = json.loads(response.data)
+    assert response_dict['errno'] == RET.OK, response_dict
+    return counter.statements
+
+
+def assert_num_queries(client, url, expected):
+    """断言接口执行的SQL数量不超过expected，打印检查结果，返回是否通过"""
+    statements = count_request_queries(client, url)
+    passed = len(statements) <= expected
+    print('%-4s %-45s queries=%-3d expected<=%d' % ('ok' if passed else 'FAIL', url, len(statements), expected))
+    if not passed:
+        for statement in statements:
+            print('     ' + ' '.join(statement.split())[:150])
+    return passed
+
+
+def main():
+    seed.reset_database()
+    seed.seed_base(area_count=2, user_count=20, house_count=400)
+    seed.seed_orders(4000, user_count=20, house_count=400)
+
+    # 发布房屋最多的房东和订单最多的房客，返回的数据条数越多越能暴露出逐条查询的问题
+    landlord_id = db.session.query(House.user_id).group_by(House.user_id) \
+        .order_by(db.func.count(House.id).desc()).first()[0]
+    custom_id = db.session.query(Order.user_id).group_by(Order.user_id) \
+        .order_by(db.func.count(Order.id).desc()).first()[0]
+    house_id = db.session.query(Order.house_id).filter(Order.status == 'COMPLETE').first()[0]
+    db.session.query(Order).filter(Order.house_id == house_id, Order.status == 'COMPLETE') \
+        .update({'comment': u'很好'}, synchronize_session=False)
+    db.session.commit()
+
+    client = app.test_client()
+    results = [
+        # 总数 + 当前页的房屋编号 + 没有缓存的房屋卡片
+        assert_num_queries(client, '/api/1.0/houses/search?aid=1&sk=new', 3),
+        assert_num_queries(client, '/api/1.0/houses/search?aid=1&sd=2018-05-01&ed=2018-05-09&sk=price-inc', 3),
+        # 房屋编号 + 没有缓存的房屋卡片
+        assert_num_queries(client, '/api/1.0/houses/index', 2),
+        # 房屋和房东 + 图片 + 设施 + 评论
+        assert_num_queries(client, '/api/1.0/houses/detail/%d' % house_id, 4),
+        # 只返回部分字段时查询的数量不变
+        assert_num_queries(client, '/api/1.0/houses/search?aid=2&sk=new&fields=house_id,title,price', 3),
+    ]
+
+    # 批量查询：查询的数量和单个房屋相同
+    batch_ids = ','.join(str(i) for i in [house_id] + list(range(1, 50)))
+    results.append(assert_num_queries(client, '/api/1.0/houses?ids=%s' % batch_ids, 1))
+    results.append(assert_num_queries(client, '/api/1.0/houses?ids=%s&detail=full' % batch_ids, 4))
+
+    login(client, landlord_id)
+    # 房屋编号 + 没有缓存的房屋卡片
+    results.append(assert_num_queries(client, '/api/1.0/users/houses', 2))
+    # 订单和房屋 + 各状态的订单数量
+    results.append(assert_num_queries(client, '/api/1.0/orders?role=landlord', 2))
+    results.append(assert_num_queries(client, '/api/1.0/orders?role=landlord&status=COMPLETE', 2))
+    results.append(assert_num_queries(client, '/api/1.0/orders?role=landlord&fields=order_id,title,status', 2))
+
+    login(client, custom_id)
+    results.append(assert_num_queries(client, '/api/1.0/orders?role=custom', 2))
+    # 后续的页不再统计数量
+    cursor = json.loads(client.get('/api/1.0/orders?role=custom').data)['data']['next_cursor']
+    results.append(assert_num_queries(client, '/api/1.0/orders?role=custom&cursor=%s' % cursor, 1))
+
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
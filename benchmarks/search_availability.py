@@ -0,0 +1,88 @@
+# -*- coding:utf-8 -*-
+"""房屋搜索按日期过滤的性能测试
+对比原先"查询冲突订单 + NOT IN列表"的做法与NOT EXISTS相关子查询，订单表逐步增大时的查询耗时
+运行方式：python -m benchmarks.search_availability
+"""
+
+
+import time
+import random
+import datetime
+from iHome import get_app, db, constants
+from iHome.models import House, Order
+from benchmarks import seed
+
+
+AREA_COUNT = 10
+USER_COUNT = 200
+HOUSE_COUNT = 2000
+# 订单表逐步增长到的数据量
+ORDER_COUNTS = [10000, 50000, 100000, 300000]
+# 每个数据量下的查询次数
+REPEAT = 20
+
+
+def legacy_search(aid, start_date, end_date):
+    """原先的做法：把所有冲突订单加载到Python，再拼接NOT IN列表"""
+    house_query = House.query.filter(House.area_id == aid)
+    conflict_orders = Order.query.filter(end_date > Order.begin_date, start_date < Order.end_date).all()
+    if conflict_orders:
+        conflict_house_ids = [order.house_id for order in conflict_orders]
+        house_query = house_query.filter(House.id.notin_(conflict_house_ids))
+    house_query = house_query.order_by(House.create_time.desc())
+    return house_query.paginate(1, constants.HOUSE_LIST_PAGE_CAPACITY, False).items
+
+
+def anti_join_search(aid, start_date, end_date):
+    """NOT EXISTS相关子查询，由数据库完成过滤"""
+    house_query = House.query.filter(House.area_id == aid)
+    house_query = house_query.filter(House.available_filter(start_date, end_date))
+    house_query = house_query.order_by(House.create_time.desc())
+    return house_query.paginate(1, constants.HOUSE_LIST_PAGE_CAPACITY, False).items
+
+
+def measure(search, params):
+    """依次执行查询，返回每次的耗时(毫秒)"""
+    costs = []
+    for aid, start_date, end_date in params:
+        begin = time.time()
+        search(aid, start_date, end_date)
+        costs.append((time.time() - begin) * 1000)
+        # 清空会话，避免身份映射中累积的对象影响下一次查询
+        db.session.remove()
+    costs.sort()
+    return costs
+
+
+def percentile(costs, p):
+    return costs[min(len(costs) - 1, int(len(costs) * p))]
+
+
+def main():
+    rnd = random.Random(0)
+    seed.reset_database()
+    seed.seed_base(AREA_COUNT, USER_COUNT, HOUSE_COUNT, rnd)
+
+    print('%10s %18s %18s %18s %18s' % ('orders', 'legacy p50(ms)', 'legacy p95(ms)',
+                                        'anti-join p50(ms)', 'anti-join p95(ms)'))
+    seeded = 0
+    for order_count in ORDER_COUNTS:
+        seed.seed_orders(order_count - seeded, USER_COUNT, HOUSE_COUNT, rnd)
+        seeded = order_count
+
+        params = []
+        for _ in range(REPEAT):
+            start_date = seed.ORDER_BASE_DATE + datetime.timedelta(days=rnd.randint(0, seed.ORDER_DATE_SPAN_DAYS))
+            end_date = start_date + datetime.timedelta(days=rnd.randint(1, 7))
+            params.append((rnd.randint(1, AREA_COUNT), start_date, end_date))
+
+        legacy = measure(legacy_search, params)
+        anti_join = measure(anti_join_search, params)
+        print('%10d %18.2f %18.2f %18.2f %18.2f' % (order_count, percentile(legacy, 0.5), percentile(legacy, 0.95),
+                                                    percentile(anti_join, 0.5), percentile(anti_join, 0.95)))
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        main()
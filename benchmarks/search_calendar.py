@@ -0,0 +1,99 @@
+# -*- coding:utf-8 -*-
+"""房屋搜索按日期过滤：预订日历索引与SQL子查询的对比
+订单表填充到100万条后生成预订日历索引，对同一批搜索条件分别使用NOT EXISTS子查询和预订日历索引
+(在城区的列表索引中跳过已被预订的房屋)查询第一页房屋编号和总数，比较查询耗时，并检查两种方式的搜索结果完全一致
+已被预订的房屋超过HOUSE_SEARCH_BOOKED_MAX_COUNT个时日历索引的方式也使用NOT EXISTS子查询，单独统计次数
+运行方式：python -m benchmarks.search_calendar
+"""
+
+
+import sys
+import time
+import random
+import datetime
+from iHome import get_app, db, constants
+from iHome.models import House
+from iHome.utils import availability, listing_index
+from benchmarks import seed
+from benchmarks.search_availability import percentile
+
+
+AREA_COUNT = 50
+USER_COUNT = 2000
+HOUSE_COUNT = 20000
+ORDER_COUNT = 1000000
+REPEAT = 50
+
+
+# 使用NOT EXISTS子查询的次数
+fallback_count = 0
+
+
+def anti_join_search(aid, start_date, end_date):
+    """NOT EXISTS相关子查询，由数据库扫描订单表，查询第一页房屋编号和总数"""
+    house_query = House.query.filter(House.area_id == aid)
+    house_query = house_query.filter(House.available_filter(start_date, end_date))
+    house_ids = [house_id for house_id, in house_query.with_entities(House.id)
+                 .order_by(House.create_time.desc(), House.id.desc()).limit(constants.HOUSE_LIST_PAGE_CAPACITY)]
+    return house_ids, house_query.count()
+
+
+def calendar_search(aid, start_date, end_date):
+    """从预订日历索引中读取已被预订的房屋，在城区的列表索引中跳过它们，不访问数据库"""
+    global fallback_count
+    booked_house_ids = availability.booked_house_ids(start_date, end_date, constants.HOUSE_SEARCH_BOOKED_MAX_COUNT)
+    if booked_house_ids is None:
+        fallback_count += 1
+        return anti_join_search(aid, start_date, end_date)
+    rows, total_count = listing_index.house_page(aid, 'new', 1, None, constants.HOUSE_LIST_PAGE_CAPACITY,
+                                                 booked_house_ids)
+    return [house_id for house_id, _ in rows[:constants.HOUSE_LIST_PAGE_CAPACITY]], total_count
+
+
+def measure(search, params):
+    """依次执行第一页查询和总数查询，返回每次的耗时(毫秒)和查询结果"""
+    costs = []
+    results = []
+    for aid, start_date, end_date in params:
+        begin = time.time()
+        results.append(search(aid, start_date, end_date))
+        costs.append((time.time() - begin) * 1000)
+        db.session.remove()
+    return sorted(costs), results
+
+
+def main():
+    rnd = random.Random(0)
+    seed.reset_database()
+    seed.seed_base(AREA_COUNT, USER_COUNT, HOUSE_COUNT, rnd)
+    seed.seed_orders(ORDER_COUNT, USER_COUNT, HOUSE_COUNT, rnd)
+
+    begin = time.time()
+    order_count, night_count = availability.rebuild()
+    listing_index.rebuild()
+    print('rebuild: %d orders, %d nights, %.1fs' % (order_count, night_count, time.time() - begin))
+
+    params = []
+    for _ in range(REPEAT):
+        start_date = seed.ORDER_BASE_DATE + datetime.timedelta(days=rnd.randint(0, seed.ORDER_DATE_SPAN_DAYS))
+        end_date = start_date + datetime.timedelta(days=rnd.randint(1, 7))
+        params.append((rnd.randint(1, AREA_COUNT), start_date, end_date))
+
+    anti_join_costs, anti_join_results = measure(anti_join_search, params)
+    calendar_costs, calendar_results = measure(calendar_search, params)
+
+    print('%10s %12s %12s' % ('', 'p50(ms)', 'p95(ms)'))
+    print('%10s %12.2f %12.2f' % ('anti-join', percentile(anti_join_costs, 0.5), percentile(anti_join_costs, 0.95)))
+    print('%10s %12.2f %12.2f' % ('calendar', percentile(calendar_costs, 0.5), percentile(calendar_costs, 0.95)))
+    print('calendar fell back to anti-join: %d/%d' % (fallback_count, len(params)))
+
+    if anti_join_results != calendar_results:
+        print('results differ between anti-join and calendar search')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
@@ -0,0 +1,90 @@
+# -*- coding:utf-8 -*-
+"""房屋关键词搜索：LIKE扫描与关键词倒排索引的对比
+生成关键词索引后，对同一批城区、关键词和排序方式分别使用数据库LIKE '%词%' + ORDER BY + COUNT和
+倒排索引与房屋列表索引的交集查询第一页房屋编号和总数，比较耗时，并检查两种方式返回的房屋和总数完全一致
+运行方式：python -m benchmarks.search_keyword
+"""
+
+
+import sys
+import time
+import random
+from iHome import get_app, db, constants
+from iHome.models import House
+from iHome.api_1_0.house import HOUSE_LIST_SORTS, query_house_page
+from iHome.utils import listing_index, search_index
+from benchmarks import seed
+from benchmarks.search_availability import percentile
+
+
+AREA_COUNT = 20
+USER_COUNT = 2000
+HOUSE_COUNT = 1000000
+REPEAT = 200
+
+
+def like_search(aid, keywords, sk):
+    """每个词都使用LIKE在标题和地址中查找，需要扫描房屋表"""
+    house_query = House.query.filter(search_index.keyword_filter(keywords))
+    if aid:
+        house_query = house_query.filter(House.area_id == aid)
+    total_count = house_query.count()
+    rows = query_house_page(house_query, sk, 1, None)
+    return [house_id for house_id, _ in rows], total_count
+
+
+def index_search(aid, keywords, sk):
+    """倒排索引和房屋列表索引求交集，得到排好序的房屋编号"""
+    rows, total_count = search_index.house_page(keywords, aid, sk, 1, None, constants.HOUSE_LIST_PAGE_CAPACITY)
+    return [house_id for house_id, _ in rows], total_count
+
+
+def measure(search, params):
+    """依次执行查询，返回每次的耗时(毫秒)和查询结果"""
+    costs = []
+    results = []
+    for aid, keywords, sk in params:
+        begin = time.time()
+        results.append(search(aid, keywords, sk))
+        costs.append((time.time() - begin) * 1000)
+        db.session.remove()
+    return sorted(costs), results
+
+
+def main():
+    rnd = random.Random(0)
+    seed.reset_database()
+    seed.seed_base(AREA_COUNT, USER_COUNT, HOUSE_COUNT, rnd, house_text=seed.random_house_text)
+
+    begin = time.time()
+    listing_index.rebuild()
+    house_count = search_index.rebuild()
+    print('rebuild: %d houses, %.1fs' % (house_count, time.time() - begin))
+
+    # 关键词由一到两个词组成，一半的查询不限城区
+    # 除了中文词，还有字母和数字：完整的词、词的一部分(lof、12)和超过MAX_GRAM_LENGTH的数字，检查两种方式的匹配规则一致
+    words = seed.TITLE_WORDS + seed.ADDRESS_WORDS + [u'lof', u'oft', u'loft', u'12', u'112', u'99', u'1000', u'123456789']
+    params = []
+    for _ in range(REPEAT):
+        q = u' '.join(rnd.sample(words, rnd.randint(1, 2)))
+        aid = rnd.choice([None, rnd.randint(1, AREA_COUNT)])
+        params.append((aid, search_index.keyword_tokens(q), rnd.choice(sorted(HOUSE_LIST_SORTS))))
+
+    like_costs, like_results = measure(like_search, params)
+    index_costs, index_results = measure(index_search, params)
+
+    print('%10s %12s %12s' % ('', 'p50(ms)', 'p95(ms)'))
+    print('%10s %12.2f %12.2f' % ('like', percentile(like_costs, 0.5), percentile(like_costs, 0.95)))
+    print('%10s %12.2f %12.2f' % ('index', percentile(index_costs, 0.5), percentile(index_costs, 0.95)))
+
+    if like_results != index_results:
+        print('keyword index differs from LIKE: %d queries' % sum(1 for a, b in zip(like_results, index_results)
+                                                                  if a != b))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
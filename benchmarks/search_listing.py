@@ -0,0 +1,86 @@
+# -*- coding:utf-8 -*-
+"""房屋搜索(不按日期筛选)：房屋列表索引与SQL排序分页的对比
+生成房屋列表索引后，对同一批城区、排序方式和页码分别使用数据库ORDER BY + OFFSET + COUNT和redis有序集合查询，
+比较得到一页房屋编号和总数的耗时，并检查两种方式返回的房屋和总数完全一致
+运行方式：python -m benchmarks.search_listing
+"""
+
+
+import sys
+import time
+import random
+from iHome import get_app, db, constants
+from iHome.models import House
+from iHome.api_1_0.house import HOUSE_LIST_SORTS, query_house_page
+from iHome.utils import listing_index
+from benchmarks import seed
+from benchmarks.search_availability import percentile
+
+
+AREA_COUNT = 20
+USER_COUNT = 2000
+HOUSE_COUNT = 100000
+REPEAT = 200
+# 页码的范围，越往后OFFSET需要跳过的数据越多
+MAX_PAGE = 500
+
+
+def sql_search(aid, sk, p):
+    """数据库排序分页，并COUNT总数"""
+    house_query = House.query.filter(House.area_id == aid)
+    total_count = house_query.count()
+    rows = query_house_page(house_query, sk, p, None)
+    return [house_id for house_id, _ in rows], total_count
+
+
+def listing_search(aid, sk, p):
+    """从有序集合中读取一页房屋编号和总数"""
+    rows, total_count = listing_index.house_page(aid, sk, p, None, constants.HOUSE_LIST_PAGE_CAPACITY)
+    return [house_id for house_id, _ in rows], total_count
+
+
+def measure(search, params):
+    """依次执行查询，返回每次的耗时(毫秒)和查询结果"""
+    costs = []
+    results = []
+    for aid, sk, p in params:
+        begin = time.time()
+        results.append(search(aid, sk, p))
+        costs.append((time.time() - begin) * 1000)
+        db.session.remove()
+    return sorted(costs), results
+
+
+def main():
+    rnd = random.Random(0)
+    seed.reset_database()
+    seed.seed_base(AREA_COUNT, USER_COUNT, HOUSE_COUNT, rnd)
+    # 订单量排序需要有不同的订单数
+    db.session.execute(House.__table__.update().values(order_count=House.id % 50))
+    db.session.commit()
+
+    begin = time.time()
+    house_count = listing_index.rebuild()
+    print('rebuild: %d houses, %.1fs' % (house_count, time.time() - begin))
+
+    params = [(rnd.randint(1, AREA_COUNT), rnd.choice(sorted(HOUSE_LIST_SORTS)), rnd.randint(1, MAX_PAGE))
+              for _ in range(REPEAT)]
+    sql_costs, sql_results = measure(sql_search, params)
+    listing_costs, listing_results = measure(listing_search, params)
+
+    print('%10s %12s %12s' % ('', 'p50(ms)', 'p95(ms)'))
+    print('%10s %12.2f %12.2f' % ('sql', percentile(sql_costs, 0.5), percentile(sql_costs, 0.95)))
+    print('%10s %12.2f %12.2f' % ('listing', percentile(listing_costs, 0.5), percentile(listing_costs, 0.95)))
+
+    problems = listing_index.check()
+    if problems or sql_results != listing_results:
+        print('listing index differs from ih_house_info: %d entries, %d pages' % (
+            len(problems), sum(1 for a, b in zip(sql_results, listing_results) if a != b)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
@@ -0,0 +1,115 @@
+# -*- coding:utf-8 -*-
+# 性能测试的数据填充工具：使用批量INSERT快速生成大量的城区、用户、房屋和订单数据
+
+
+import random
+import datetime
+from iHome import db
+from iHome.models import Area, User, House, Order
+
+
+# 每次批量INSERT的行数
+BATCH_SIZE = 5000
+# 订单日期的起点和跨度，从今天开始，过去日期的预订日历位图已经过期
+ORDER_BASE_DATE = datetime.datetime.combine(datetime.date.today(), datetime.time())
+ORDER_DATE_SPAN_DAYS = 730
+ORDER_STATUSES = ['WAIT_ACCEPT', 'WAIT_PAYMENT', 'PAID', 'WAIT_COMMENT', 'COMPLETE', 'CANCELED', 'REJECTED']
+
+
+def bulk_insert(table, rows):
+    """分批执行INSERT，避免单条语句过大"""
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[i:i + BATCH_SIZE])
+    db.session.commit()
+
+
+def reset_database():
+    """清空并重建所有表"""
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+
+# 生成房屋标题和地址使用的词
+TITLE_WORDS = [u'海景', u'地铁口', u'温馨', u'大床房', u'精装', u'公寓', u'别墅', u'近机场', u'loft', u'江景',
+               u'学区', u'阳光', u'复式', u'民宿', u'花园', u'安静', u'两室一厅', u'独立卫浴', u'可做饭', u'山景']
+ADDRESS_WORDS = [u'朝阳区', u'海淀区', u'浦东新区', u'天河区', u'南山区', u'西湖区', u'武侯区', u'鼓楼区',
+                 u'中山路', u'人民路', u'解放路', u'建设路', u'长江路', u'滨江大道', u'科技园', u'大学城']
+
+
+def random_house_text(i, rnd):
+    """由随机的词组成房屋标题和地址，用于关键词搜索的测试"""
+    title = u''.join(rnd.sample(TITLE_WORDS, rnd.randint(2, 4))) + u'%d号' % i
+    address = u''.join(rnd.sample(ADDRESS_WORDS, 2)) + u'%d号' % rnd.randint(1, 999)
+    return title, address
+
+
+def seed_base(area_count=10, user_count=200, house_count=2000, rnd=None, house_text=None):
+    """生成城区、用户和房屋数据
+    house_text(i, rnd)返回第i个房屋的(标题, 地址)，不传时使用固定的格式
+    """
+    rnd = rnd or random.Random(0)
+    now = datetime.datetime.now()
+
+    areas = [{'id': i, 'name': u'城区%d' % i, 'create_time': now, 'update_time': now}
+             for i in range(1, area_count + 1)]
+    bulk_insert(Area.__table__, areas)
+
+    users = [{'id': i, 'name': u'用户%d' % i, 'mobile': '1%010d' % i, 'password_hash': 'x',
+              'avatar_url': 'avatar%d' % i, 'create_time': now, 'update_time': now}
+             for i in range(1, user_count + 1)]
+    bulk_insert(User.__table__, users)
+
+    houses = []
+    for i in range(1, house_count + 1):
+        ctime = now - datetime.timedelta(minutes=i)
+        title, address = house_text(i, rnd) if house_text else (u'房屋%d' % i, u'地址%d' % i)
+        houses.append({
+            'id': i,
+            'user_id': rnd.randint(1, user_count),
+            'area_id': rnd.randint(1, area_count),
+            'title': title,
+            'price': rnd.randint(100, 100000),
+            'address': address,
+            'room_count': rnd.randint(1, 5),
+            'acreage': rnd.randint(10, 200),
+            'unit': u'两室一厅',
+            'capacity': rnd.randint(1, 6),
+            'beds': u'双人床',
+            'deposit': 0,
+            'min_days': 1,
+            'max_days': 0,
+            'order_count': 0,
+            'index_image_url': 'image%d' % i,
+            'create_time': ctime,
+            'update_time': ctime
+        })
+    bulk_insert(House.__table__, houses)
+
+
+def seed_orders(count, user_count=200, house_count=2000, rnd=None):
+    """追加生成count条订单数据"""
+    rnd = rnd or random.Random(0)
+    now = datetime.datetime.now()
+
+    orders = []
+    for _ in range(count):
+        begin_date = ORDER_BASE_DATE + datetime.timedelta(days=rnd.randint(0, ORDER_DATE_SPAN_DAYS))
+        days = rnd.randint(1, 7)
+        orders.append({
+            'user_id': rnd.randint(1, user_count),
+            'house_id': rnd.randint(1, house_count),
+            'begin_date': begin_date,
+            'end_date': begin_date + datetime.timedelta(days=days),
+            'days': days,
+            'house_price': 10000,
+            'amount': 10000 * days,
+            'status': rnd.choice(ORDER_STATUSES),
+            'create_time': now,
+            'update_time': now
+        })
+        if len(orders) >= BATCH_SIZE:
+            bulk_insert(Order.__table__, orders)
+            orders = []
+    if orders:
+        bulk_insert(Order.__table__, orders)
@@ -0,0 +1,128 @@
+# -*- coding:utf-8 -*-
+"""部分字段(fields参数)：响应大小和数据库查询耗时的对比
+bytes: 房屋搜索、首页、房屋详情和订单列表返回所有字段与只返回部分字段时的响应大小
+db: 订单列表和房屋卡片加载整个实体与只加载需要的列(load_only)时的查询耗时，统计p50和p99，并检查两种方式生成的数据相同
+运行方式：python -m benchmarks.sparse_fields
+"""
+
+
+import sys
+import time
+import random
+import logging
+from iHome import get_app, db, constants
+from iHome.models import House, Order
+from iHome.utils import listing_index
+from benchmarks import seed
+from benchmarks.query_count import login
+from benchmarks.search_availability import percentile
+
+
+AREA_COUNT = 20
+USER_COUNT = 200
+HOUSE_COUNT = 20000
+ORDER_COUNT = 200000
+REPEAT = 200
+# 搜索结果每页的房屋数量，使用接近实际页面的数量，而不是默认的每页2条
+PAGE_CAPACITY = 20
+
+HOUSE_FIELDS = 'house_id,title,price,img_url'
+DETAIL_FIELDS = 'hid,title,price,img_urls'
+ORDER_FIELDS = 'order_id,title,status,amount'
+
+
+def query_orders(user_id, fields):
+    """房东的一页订单，fields为None时加载整个订单和房屋"""
+    order_query = Order.query.join(House, Order.house_id == House.id).filter(House.user_id == user_id)
+    if fields is None:
+        order_query = order_query.options(db.contains_eager(Order.house))
+    else:
+        order_columns, house_columns = Order.dict_columns(fields)
+        order_query = order_query.options(db.load_only(*order_columns),
+                                          db.contains_eager(Order.house).load_only(*house_columns))
+    orders = order_query.order_by(Order.id.desc()).limit(constants.ORDER_LIST_PAGE_CAPACITY).all()
+    return [order.to_dict(fields) for order in orders]
+
+
+def query_cards(house_ids, sparse):
+    """房屋卡片的数据，sparse为False时加载整个房屋、城区和房东"""
+    if sparse:
+        options = [db.load_only(*House.BASIC_COLUMNS), db.joinedload(House.area).load_only('name'),
+                   db.joinedload(House.user).load_only('avatar_url')]
+    else:
+        options = [db.joinedload(House.area), db.joinedload(House.user)]
+    houses = House.query.filter(House.id.in_(house_ids)).options(*options).order_by(House.id).all()
+    return [house.to_basic_dict() for house in houses]
+
+
+def measure(query, params):
+    """依次执行查询，返回每次的耗时(毫秒)和查询结果"""
+    costs = []
+    results = []
+    for args in params:
+        begin = time.time()
+        results.append(query(*args))
+        costs.append((time.time() - begin) * 1000)
+        db.session.remove()
+    return sorted(costs), results
+
+
+def main():
+    # 调试模式下接口会输出调试日志，不统计日志的耗时
+    app.logger.setLevel(logging.WARN)
+    constants.HOUSE_LIST_PAGE_CAPACITY = PAGE_CAPACITY
+    rnd = random.Random(0)
+    seed.reset_database()
+    seed.seed_base(AREA_COUNT, USER_COUNT, HOUSE_COUNT, rnd)
+    seed.seed_orders(ORDER_COUNT, USER_COUNT, HOUSE_COUNT, rnd)
+    listing_index.rebuild()
+    db.session.remove()
+
+    landlord_id = db.session.query(House.user_id).group_by(House.user_id) \
+        .order_by(db.func.count(House.id).desc()).first()[0]
+    house_id = db.session.query(Order.house_id).filter(Order.status == 'COMPLETE').first()[0]
+
+    client = app.test_client()
+    login(client, landlord_id)
+    urls = [
+        ('search', '/api/1.0/houses/search?aid=1&sk=new', HOUSE_FIELDS),
+        ('index', '/api/1.0/houses/index', HOUSE_FIELDS),
+        ('detail', '/api/1.0/houses/detail/%d' % house_id, DETAIL_FIELDS),
+        ('orders', '/api/1.0/orders?role=landlord', ORDER_FIELDS),
+    ]
+    print('%-8s %10s %10s %8s' % ('bytes', 'all', 'fields', 'saved'))
+    for name, url, fields in urls:
+        full = len(client.get(url).data)
+        sparse = len(client.get('%s%sfields=%s' % (url, '&' if '?' in url else '?', fields)).data)
+        print('%-8s %10d %10d %7.1f%%' % (name, full, sparse, 100.0 * (full - sparse) / full))
+
+    order_fields = ORDER_FIELDS.split(',')
+    landlord_ids = [landlord_id] + [rnd.randint(1, USER_COUNT) for _ in range(REPEAT - 1)]
+    card_ids = [rnd.sample(range(1, HOUSE_COUNT + 1), PAGE_CAPACITY) for _ in range(REPEAT)]
+    results = [
+        ('orders', measure(query_orders, [(user_id, None) for user_id in landlord_ids]),
+         measure(query_orders, [(user_id, order_fields) for user_id in landlord_ids])),
+        ('cards', measure(query_cards, [(house_ids, False) for house_ids in card_ids]),
+         measure(query_cards, [(house_ids, True) for house_ids in card_ids])),
+    ]
+
+    print('%-8s %-8s %12s %12s' % ('db', '', 'p50(ms)', 'p99(ms)'))
+    same = True
+    for name, (before_costs, before_results), (after_costs, after_results) in results:
+        print('%-8s %-8s %12.3f %12.3f' % (name, 'entity', percentile(before_costs, 0.5),
+                                           percentile(before_costs, 0.99)))
+        print('%-8s %-8s %12.3f %12.3f' % (name, 'columns', percentile(after_costs, 0.5),
+                                           percentile(after_costs, 0.99)))
+        if name == 'orders':
+            before_results = [[dict((field, order[field]) for field in order_fields) for order in orders]
+                              for orders in before_results]
+        if before_results != after_results:
+            print('%s: results differ' % name)
+            same = False
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    app = get_app('unittest')
+    with app.app_context():
+        sys.exit(main())
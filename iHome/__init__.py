@@ -5,7 +5,7 @@ from config import Config, configs
 from flask import Flask
 from flask_session import Session
 import redis
-from iHome.utils.common import RegexConverter
+from iHome.utils.common import RegexConverter, skip_public_session
 import logging
 from logging.handlers import RotatingFileHandler
 
@@ -50,13 +50,16 @@ def get_app(config_name):
 
     # 3. 创建连接到redis数据库的对象
     global redis_store
-    redis_store = redis.StrictRedis(host=configs[config_name].REDIS_HOST, port=configs[config_name].REDIS_PORT)
+    redis_store = redis.StrictRedis(host=configs[config_name].REDIS_HOST, port=configs[config_name].REDIS_PORT,
+                                    db=configs[config_name].REDIS_DB)
 
     # 4. 开启CSRFf防护
     CSRFProtect(app)
 
     # 6.使用session在flask拓展实现将session数据存储在redis中
     Session(app)
+    # 可以被公共缓存保存的响应不输出session的Set-Cookie
+    app.session_interface = skip_public_session(app.session_interface)
 
     # 导入自定义的路由转换器
     app.url_map.converters['re'] = RegexConverter
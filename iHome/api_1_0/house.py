@@ -3,15 +3,33 @@
 
 
 from . import api
-from iHome.models import Area, House, Facility, HouseImage, Order
+from iHome.models import Area, House, Facility, HouseImage, Order, house_facility
 from flask import current_app, jsonify, request, g, session
 from iHome.utils.response_code import RET
-from iHome.utils.common import login_required
+from iHome.utils.common import login_required, json_bytes, raw_jsonify, parse_fields, pick_fields, make_etag, \
+    conditional_response, not_modified
 from iHome import db, constants, redis_store
 from iHome.utils.image_storage import upload_image
+from iHome.utils.pagination import encode_cursor, decode_cursor
+from iHome.utils.cache import cached, read_caches, write_caches
+from iHome.utils.local_cache import local_cached
+from iHome.utils import availability, listing_index, search_index, suggest_index, house_card, facets
+from iHome.utils.cache_generation import house_list_generation, house_list_generation_time, invalidate_house_list
+import time
 import datetime
 
 
+# 房屋列表的排序方式 sk: (排序字段, 是否倒序)
+# new:最新，按照发布时间倒序; booking:订单量，按照订单量倒序；price-inc 价格低到高；price-des 价格高到低
+# 排序值相同时再按房屋编号排序，保证顺序稳定，游标才能准确定位到上一页的最后一条数据
+HOUSE_LIST_SORTS = {
+    'new': (House.create_time, True),
+    'booking': (House.order_count, True),
+    'price-inc': (House.price, False),
+    'price-des': (House.price, True)
+}
+
+
 # http://127.0.0.1:5000/search.html?aid=2&aname=&sd=&ed=&p=&sk=
 """首页房屋信息的显示: 分页 排序"""
 @api.route('/houses/search')
@@ -20,27 +38,57 @@ def get_houses_search():
     1.查询所有的房屋信息
     2.构造响应数据
     3.响应结果
+
+    分页有两种方式：
+    p: 页码分页
+    cursor: 游标分页，传入上一页响应中的next_cursor，第一页传空字符串，不受页数影响
+
+    筛选条件(可选)：minp/maxp 价格区间(元)，rooms 最少房间数，capacity 最少入住人数，fac 必须有的设施编号(以逗号分隔)
+    q 关键词：标题或地址中包含关键词的房屋，可以和城区、入住时间、筛选条件、排序方式一起使用
+    fields 房屋需要的字段(以逗号分隔)，如 fields=house_id,title,price，不传时返回所有字段
     """
 
     current_app.logger.debug(request.args)
 
     # 获取地区参数
     aid = request.args.get('aid')
-    # 获取排序参数: new:最新，按照发布时间倒序; booking:订单量，安装订单量倒序；price-inc 价格低到高；price-des 价格高到低
+    # 获取排序参数，不支持的排序方式按照最新排序
     sk = request.args.get('sk')
+    if sk not in HOUSE_LIST_SORTS:
+        sk = 'new'
     # 获取用户传入的页码
     p = request.args.get('p', '1') # 如果不传，默认第一页
+    # 获取游标
+    cursor = request.args.get('cursor')
     # 获取入住时间
     sd = request.args.get('sd', '') # u'2018-04-07'
     # 获取离开时间
     ed = request.args.get('ed', '') # u'2018-04-08'
+    # 获取关键词
+    q = request.args.get('q', '').strip()
 
     start_date = None
     end_date = None
+    cursor_values = None
+    keywords = None
+    fields = None
+
+    # 按设施筛选时需要校验设施是否存在，只在传入了fac时加载所有的设施编号
+    facility_ids = None
+    if request.args.get('fac'):
+        try:
+            facility_ids = load_facility_ids()
+        except Exception as e:
+            current_app.logger.error(e)
+            return jsonify(errno=RET.DBERR, errmsg='查询设施信息失败')
 
     # 校验参数
     try:
+        # 城区编号转换为整数，aid=01、aid=1和缓存的版本号、缓存key使用同一个城区编号
+        aid = int(aid) if aid else None
+
         p = int(p)
+        assert p > 0, Exception('页码有误')
 
         if sd:
             # 将时间字符串转成时间对象
@@ -52,129 +100,325 @@ def get_houses_search():
         if start_date and end_date:
             # 断言：入住时间一定小于离开时间，如果不满足，就抛出异常
             assert start_date < end_date, Exception('入住时间有误')
+            assert (end_date - start_date).days <= constants.HOUSE_BOOKING_MAX_DAYS, Exception('入住时间段过长')
+
+        # 游标中保存的是 [排序方式, 排序值, 房屋编号]
+        if cursor:
+            cursor_sk, last_value, last_id = decode_cursor(cursor)
+            assert cursor_sk == sk, Exception('游标与排序方式不一致')
+            cursor_values = (last_value, last_id)
+
+        # 价格、房间数、入住人数和设施的筛选条件
+        filters = facets.parse_filters(request.args, facility_ids)
+
+        # 关键词切分成词，按词在倒排索引中查找
+        if q:
+            assert len(q) <= constants.HOUSE_SEARCH_KEYWORD_MAX_LENGTH, Exception('关键词过长')
+            keywords = search_index.keyword_tokens(q)
+
+        # 房屋需要的字段
+        fields = parse_fields(request.args.get('fields'), House.BASIC_FIELDS)
 
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.PARAMERR, errmsg='参数有误')
 
-    # 在查询数据之前，读取缓存数据
+    # 客户端缓存的这一页仍然有效时直接返回304：城区内的房屋、订单或者房屋卡片变化后缓存的版本号才会增加，
+    # 版本号和请求参数都没有变化时响应内容相同，不需要读取缓存和查询数据库
+    etag, last_modified = house_list_etag(aid)
+    if etag:
+        response = not_modified(constants.HOUSE_LIST_CACHE_CONTROL, etag, last_modified)
+        if response:
+            return response
+
+    # 1.查询房屋信息：每一页序列化好的响应数据按照筛选条件缓存，缓存命中时只需要读取一次
     try:
-        name = 'house_list_%s_%s_%s_%s' % (aid, sd, ed, sk)
-        response_data = redis_store.hget(name, p)
-        return jsonify(errno=RET.OK, errmsg='OK', data=eval(response_data))
+        response_json = load_house_list(aid, sd, ed, sk, p, cursor, start_date=start_date, end_date=end_date,
+                                        cursor_values=cursor_values, filters=filters, keywords=keywords,
+                                        fields=fields)
     except Exception as e:
         current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='查询房屋信息失败')
+
+    # 2.响应结果：缓存的已经是序列化好的JSON，直接拼接到响应中，不需要解码再编码
+    # 提示：如果重新构造了响应数据，需要把之前前端界面的house_dict_list的获取修改一下response.data.houses
+    return conditional_response(raw_jsonify(response_json), constants.HOUSE_LIST_CACHE_CONTROL, etag, last_modified)
+
 
-    # 1.查询所有的房屋信息 houses == [House,House,House,...]
+def house_list_etag(aid):
+    """房屋列表类接口的ETag和Last-Modified，由城区的缓存版本号和请求参数生成
+    redis异常时返回(None, None)，响应的ETag使用响应体的摘要
+    """
     try:
-        # 无条件查询所有房屋数据
-        # houses = House.query.all()
+        generation, last_modified = house_list_generation_time(aid)
+    except Exception as e:
+        current_app.logger.error(e)
+        return None, None
+    return make_etag(request.path, aid, generation, sorted(request.args.items(multi=True))), last_modified
 
-        # 得到BaseQuery对象，保存即将要查询出来的数据
-        house_query = House.query
 
-        # 根据用户选中的城区信息，筛选出满足条件的房屋信息
-        if aid:
-            house_query = house_query.filter(House.area_id == aid)
+def house_list_cache_key(aid, sd, ed, sk, p, cursor, filters=None, keywords=None, fields=None, **kwargs):
+    """房屋列表的缓存key
+    带上城区的缓存版本号，城区内的房屋、订单或者房屋卡片变化后版本号增加，旧的缓存就不会再被读取
+    页码分页使用页码区分，游标分页使用游标区分，游标分页的第一页和页码分页的第一页相同
+    不同的字段组合响应内容不同，分别缓存
+    """
+    generation = house_list_generation(aid)
+    return 'house_list_json_%s_%s_%s_%s_%s_%s_%s_%s' % (aid, generation, sd, ed, house_filters_key(filters, keywords),
+                                                       ','.join(fields or []), sk, cursor if cursor else p)
 
-        # 根据用户传入的入住时间和离开的时间，跟订单里面的时间进行对比
-        # 如果用户传入的时间段，在订单中，也存在，就把满足冲突条件的订单查询出来 conflict_orders
-        conflict_orders = []
-        if start_date and end_date:
-            conflict_orders = Order.query.filter(end_date > Order.begin_date, start_date < Order.end_date).all()
-        elif start_date:
-            conflict_orders = Order.query.filter(start_date < Order.end_date).all()
-        elif end_date:
-            conflict_orders = Order.query.filter(end_date > Order.begin_date).all()
-
-        # 再通过冲突的订单，查询出里面的house_id,封装到列表中 conflict_house_ids
-        if conflict_orders:
-            conflict_house_ids = [order.house_id for order in conflict_orders]
-            # 最后在查询House是，not_in(conflict_house_ids)
-            house_query = house_query.filter(House.id.notin_(conflict_house_ids))
-
-
-        # 根据排序规则对数据进行排序
-        if sk == 'booking':
-            house_query = house_query.order_by(House.order_count.desc())
-        elif sk == 'price-inc':
-            house_query = house_query.order_by(House.price.asc())
-        elif sk == 'price-des':
-            house_query = house_query.order_by(House.price.desc())
+
+def house_filters_key(filters, keywords):
+    """筛选条件和关键词在缓存key中的部分"""
+    return '%s|%s' % (facets.filters_key(filters or {}), ','.join(keywords or []))
+
+
+@cached(house_list_cache_key, constants.HOUSE_LIST_REDIS_EXPIRES, raw=True)
+def load_house_list(aid, sd, ed, sk, p, cursor, start_date=None, end_date=None, cursor_values=None, filters=None,
+                    keywords=None, fields=None):
+    """查询房屋列表的一页，返回序列化好的响应数据
+    1.查询所有的房屋信息
+    2.构造响应数据：房屋信息从房屋卡片中批量读取，只保留需要的字段，和总页数、下一页的游标一起序列化
+    """
+
+    # 1.查询所有的房屋信息
+    # 得到BaseQuery对象，保存即将要查询出来的数据
+    house_query = House.query
+
+    # 根据用户选中的城区信息，筛选出满足条件的房屋信息
+    if aid:
+        house_query = house_query.filter(House.area_id == aid)
+
+    # 价格、房间数、入住人数和设施的筛选条件，设施使用房屋表中的设施位图判断，不需要关联设施表
+    filters = filters or {}
+    house_query = facets.apply_filters(house_query, filters)
+
+    # 根据用户传入的入住时间和离开的时间，跟订单里面的时间进行对比
+    # 入住和离开时间都有时，从预订日历索引中读取这段时间已被预订的房屋，不需要扫描订单表
+    # 已被预订的房屋超过HOUSE_SEARCH_BOOKED_MAX_COUNT个时不读取，和索引还没有生成、redis异常时一样使用数据库查询
+    booked_house_ids = None
+    if start_date and end_date:
+        try:
+            booked_house_ids = availability.booked_house_ids(start_date, end_date,
+                                                             constants.HOUSE_SEARCH_BOOKED_MAX_COUNT)
+        except Exception as e:
+            current_app.logger.error(e)
+
+    # 没有其它筛选条件时，从房屋列表索引中读取一页房屋编号和房屋总数，不需要数据库排序、OFFSET和COUNT
+    # 有关键词时使用列表索引和关键词倒排索引的交集，按日期搜索时读取这一页时跳过已被预订的房屋
+    # 索引还没有生成、redis异常或者游标定位不到时，使用数据库查询
+    listing_page = None
+    if not filters and (booked_house_ids is not None or not (start_date or end_date)):
+        try:
+            if keywords:
+                listing_page = search_index.house_page(keywords, aid, sk, p, cursor_values,
+                                                       constants.HOUSE_LIST_PAGE_CAPACITY, booked_house_ids)
+            else:
+                listing_page = listing_index.house_page(aid, sk, p, cursor_values, constants.HOUSE_LIST_PAGE_CAPACITY,
+                                                        booked_house_ids)
+        except Exception as e:
+            current_app.logger.error(e)
+
+    if listing_page is None:
+        # 使用数据库查询时，日期交给数据库执行NOT EXISTS子查询，只检查筛选出的房屋
+        if start_date or end_date:
+            house_query = house_query.filter(House.available_filter(start_date, end_date))
+
+        # 关键词从倒排索引中得到包含所有词的房屋编号，超过HOUSE_SEARCH_KEYWORD_MAX_MATCHES个、
+        # 索引还没有生成或者redis异常时使用LIKE扫描，SQL中的房屋编号列表不会过长
+        if keywords:
+            matching_house_ids = None
+            try:
+                matching_house_ids = search_index.matching_house_ids(keywords,
+                                                                     constants.HOUSE_SEARCH_KEYWORD_MAX_MATCHES)
+            except Exception as e:
+                current_app.logger.error(e)
+            if matching_house_ids:
+                house_query = house_query.filter(House.id.in_(db.bindparam('matching_house_ids', expanding=True))) \
+                    .params(matching_house_ids=matching_house_ids)
+            elif matching_house_ids is not None:
+                house_query = house_query.filter(db.false())
+            else:
+                house_query = house_query.filter(search_index.keyword_filter(keywords))
+
+    # rows == [(房屋编号, 排序值), ...]
+    if listing_page is not None:
+        rows, total_count = listing_page
+        total_page = get_total_page(total_count)
+    else:
+        # 获取一共分了多少页，一定要传给前端：满足条件的房屋总数按筛选条件缓存，不需要每一页都执行COUNT
+        total_page = get_house_total_page(house_query, aid, sd, ed, house_filters_key(filters, keywords))
+        rows = query_house_page(house_query, sk, p, cursor_values)
+
+    # 获取当前页的房屋编号，并生成下一页的游标
+    next_cursor = None
+    if len(rows) > constants.HOUSE_LIST_PAGE_CAPACITY:
+        rows = rows[:constants.HOUSE_LIST_PAGE_CAPACITY]
+        last_id, last_value = rows[-1]
+        next_cursor = encode_cursor(sk, last_value, last_id)
+
+    # 2.构造响应数据：房屋卡片已经是序列化好的JSON，直接拼接
+    houses_json = house_card.cards_json([house_id for house_id, _ in rows], fields)
+    return b'{"houses":%s,"total_page":%s,"next_cursor":%s}' % (
+        houses_json, json_bytes(total_page), json_bytes(next_cursor))
+
+
+def query_house_page(house_query, sk, p, cursor_values):
+    """使用数据库排序并查询一页房屋的编号和排序值，多查询一条数据，用来判断是否还有下一页"""
+    return house_page_query(house_query, sk, p, cursor_values).all()
+
+
+def house_page_query(house_query, sk, p, cursor_values):
+    """在房屋查询上加上排序、分页，只查询房屋编号和排序值"""
+    # 根据排序规则对数据进行排序
+    sort_column, descending = HOUSE_LIST_SORTS[sk]
+    if descending:
+        house_query = house_query.order_by(sort_column.desc(), House.id.desc())
+    else:
+        house_query = house_query.order_by(sort_column.asc(), House.id.asc())
+
+    if cursor_values:
+        # 游标分页：从上一页最后一条数据之后继续查询，可以直接利用索引定位，不需要跳过前面的数据
+        last_value, last_id = cursor_values
+        if descending:
+            house_query = house_query.filter(db.or_(sort_column < last_value,
+                                                    db.and_(sort_column == last_value, House.id < last_id)))
         else:
-            house_query = house_query.order_by(House.create_time.desc())
+            house_query = house_query.filter(db.or_(sort_column > last_value,
+                                                    db.and_(sort_column == last_value, House.id > last_id)))
+    else:
+        house_query = house_query.offset((p - 1) * constants.HOUSE_LIST_PAGE_CAPACITY)
+
+    # 只查询房屋编号和排序值，房屋信息从房屋卡片中读取
+    return house_query.with_entities(House.id, sort_column).limit(constants.HOUSE_LIST_PAGE_CAPACITY + 1)
+
 
-        # 无条件的从BaseQuery对象中取出数据
-        # houses = house_query.all()
+def get_total_page(total_count):
+    """根据房屋总数计算总页数"""
+    capacity = constants.HOUSE_LIST_PAGE_CAPACITY
+    return (int(total_count) + capacity - 1) // capacity
 
-        # 需要使用分页功能，避免一次性查询所有数据，使用分页代码，替换all()
-        # 每页两条数据 paginate == 一本书，书里面有好多页
-        paginate = house_query.paginate(p, constants.HOUSE_LIST_PAGE_CAPACITY, False)
-        # 获取当前页的房屋模型对象 houses == [House, House],
-        houses = paginate.items
-        # 获取一共分了多少页，一定要传给前端
-        total_page = paginate.pages
 
+def get_house_total_page(house_query, aid, sd, ed, fk):
+    """获取房屋列表的总页数
+    总数与排序方式、页码无关，按照城区、城区的缓存版本号、入住时间和筛选条件(fk)缓存，缓存失效后才重新COUNT
+    """
+    name = None
+    total_count = None
+    try:
+        name = 'house_count_%s_%s_%s_%s_%s' % (aid, house_list_generation(aid), sd, ed, fk)
+        total_count = redis_store.get(name)
     except Exception as e:
         current_app.logger.error(e)
-        return jsonify(errno=RET.DBERR, errmsg='查询房屋信息失败')
 
-    # 2.构造响应数据
-    house_dict_list = []
-    for house in houses:
-        house_dict_list.append(house.to_basic_dict())
+    if total_count is None:
+        total_count = house_query.order_by(None).count()
+        if name:
+            try:
+                redis_store.set(name, total_count, constants.HOUSE_LIST_COUNT_REDIS_EXPIRES)
+            except Exception as e:
+                current_app.logger.error(e)
+
+    return get_total_page(total_count)
+
+"""搜索框的输入提示"""
+@api.route('/houses/suggest')
+def get_house_suggestions():
+    """提供以输入内容开头的城区和房屋标题，按订单数从高到低排列
+    1.获取参数：q 用户已经输入的内容
+    2.从前缀索引中读取提示：一次redis查询，不查询数据库
+    3.响应结果
+    """
 
-    # 提示：如果重新构造了响应数据，需要把之前前端界面的house_dict_list的获取修改一下response.data.houses
-    response_data = {
-        'houses':house_dict_list,
-        'total_page':total_page
-    }
+    # 1.获取参数
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify(errno=RET.PARAMERR, errmsg='缺少参数')
 
-    # 缓存房屋列表数据
+    # 2.从前缀索引中读取提示
     try:
-        name = 'house_list_%s_%s_%s_%s' % (aid,sd,ed,sk)
+        suggestions_json = suggest_index.suggest(q, constants.SUGGEST_MAX_COUNT)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='查询输入提示失败')
 
-        # 创建redis管道:用于存放后面的所有的redis操作的，看做一整整体
-        pipeline = redis_store.pipeline()
-        # 开启事务
-        pipeline.multi()
+    # 3.响应结果：提示内容已经是序列化好的JSON，直接拼接到响应中
+    return raw_jsonify(suggestions_json)
 
-        # 需要看做整体的redis操作
-        redis_store.hset(name, p, response_data)
-        redis_store.expire(name, constants.HOUSE_LIST_REDIS_EXPIRES)
+"""房屋搜索的分面统计"""
+@api.route('/houses/facets')
+def get_house_facets():
+    """提供城区内各价格区间和各设施的房屋数量，用于搜索页展示筛选项
+    1.获取参数：aid 城区编号，不传表示不限城区
+    2.查询分面统计：按城区缓存，发布房屋后删除缓存
+    3.响应结果
+    """
 
-        # 执行/提交事务
-        pipeline.execute()
+    # 1.获取参数
+    aid = request.args.get('aid')
+    try:
+        aid = int(aid) if aid else None
     except Exception as e:
         current_app.logger.error(e)
-        # redis发现异常，不需要手动回滚
+        return jsonify(errno=RET.PARAMERR, errmsg='参数有误')
+
+    # 2.查询分面统计
+    try:
+        house_facets = load_house_facets(aid)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='查询房屋数据失败')
 
     # 3.响应结果
-    return jsonify(errno=RET.OK, errmsg='OK', data=response_data)
+    return jsonify(errno=RET.OK, errmsg='OK', data=house_facets)
+
+
+@cached(lambda aid: constants.HOUSE_FACETS_CACHE_KEY % (aid or 'all'), constants.HOUSE_FACETS_REDIS_EXPIRES)
+def load_house_facets(aid):
+    """统计城区内各价格区间和各设施的房屋数量"""
+    return facets.facet_counts(aid, load_facility_ids())
+
+
+def delete_house_facets(area_id):
+    """城区内的房屋变化后，删除该城区和不限城区的分面统计缓存"""
+    redis_store.delete(constants.HOUSE_FACETS_CACHE_KEY % area_id, constants.HOUSE_FACETS_CACHE_KEY % 'all')
 
 """新发布的房源显示"""
 @api.route('/houses/index')
 def get_house_index():
     """提供房屋最新的推荐
     1.查询最新发布的五个房屋信息,（按照时间排倒序）
-    2.构造响应数据
-    3.响应结果
+    2.响应结果
+
+    fields 房屋需要的字段(以逗号分隔)，不传时返回所有字段
     """
 
-    # 1.查询最新发布的五个房屋信息 houses == [House, House, House, ...]
     try:
-        houses = House.query.order_by(House.create_time.desc()).limit(constants.HOME_PAGE_MAX_HOUSES)
+        fields = parse_fields(request.args.get('fields'), House.BASIC_FIELDS)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.PARAMERR, errmsg='参数有误')
+
+    # 1.获取预先生成的首页房屋编号，再从房屋卡片缓存中批量读取房屋信息，一般不需要查询数据库
+    try:
+        houses_json = house_card.cards_json(load_house_index(), fields)
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='查询房屋数据失败')
 
-    # 2.构造响应数据
-    house_dict_list = []
-    for house in houses:
-        house_dict_list.append(house.to_basic_dict())
+    # 2.响应结果：房屋卡片已经是序列化好的JSON，直接拼接到响应中
+    # 首页数据缓存过期后可能先返回旧数据，ETag使用响应体的摘要，和实际返回的数据一致
+    return conditional_response(raw_jsonify(houses_json), constants.HOUSE_INDEX_CACHE_CONTROL)
 
-    # 3.响应结果
-    return jsonify(errno=RET.OK, errmsg='OK', data=house_dict_list)
+
+@cached(lambda: constants.HOUSE_INDEX_CACHE_KEY, constants.HOME_PAGE_DATA_REDIS_EXPIRES)
+def load_house_index():
+    """查询最新发布的五个房屋的编号
+    发布新房源时，调用load_house_index.refresh()重新生成
+    """
+    houses = db.session.query(House.id).order_by(House.create_time.desc()) \
+        .limit(constants.HOME_PAGE_MAX_HOUSES).all()
+    return [house_id for house_id, in houses]
 
 """房屋详情页面的显示"""
 @api.route('/houses/detail/<int:house_id>')
@@ -184,25 +428,169 @@ def get_house_detail(house_id):
     1.查询房屋全部信息
     2.构造响应数据
     3.响应结果
+
+    fields 房屋需要的字段(以逗号分隔)，不传时返回所有字段
     """
 
-    # 1.查询房屋全部信息
     try:
-        house = House.query.get(house_id)
+        fields = parse_fields(request.args.get('fields'), House.FULL_FIELDS)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.PARAMERR, errmsg='参数有误')
+
+    # 1.查询房屋全部信息：房屋信息与登录用户无关，按照house_id缓存，不同的字段组合共用同一份缓存
+    try:
+        response_data = load_house_detail(house_id)
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='查询房屋数据失败')
-    if not house:
+    if not response_data:
         return jsonify(errno=RET.NODATA, errmsg='房屋不存在')
 
     # 2.构造响应数据
-    response_data = house.to_full_dict()
-
     # 获取user_id : 当用户登录后访问detail.html，就会有user_id，反之，没有user_id
     login_user_id = session.get('user_id', -1)
 
-    # 3.响应结果
-    return jsonify(errno=RET.OK, errmsg='OK', data={'house':response_data, 'login_user_id':login_user_id})
+    # 3.响应结果：ETag使用响应体的摘要，房屋信息来自缓存，客户端的缓存仍然有效时返回304，不再发送响应体
+    response = jsonify(errno=RET.OK, errmsg='OK', data={'house':pick_fields(response_data, fields),
+                                                        'login_user_id':login_user_id})
+    return conditional_response(response, constants.HOUSE_DETAIL_CACHE_CONTROL)
+
+
+@cached(lambda house_id: constants.HOUSE_DETAIL_CACHE_KEY % house_id, constants.HOUSE_DETAIL_REDIS_EXPIRE_SECOND)
+def load_house_detail(house_id):
+    """查询房屋的详细信息，房屋不存在时返回None"""
+    return query_house_details([house_id]).get(house_id)
+
+
+"""批量查询房屋信息"""
+@api.route('/houses', methods=['GET'])
+def get_houses_batch():
+    """一次获取多个房屋的信息，代替逐个请求房屋详情
+    1.获取参数：ids 以逗号分隔的房屋编号；detail 为full时返回详细信息，默认返回基本信息；fields 需要的字段
+    2.校验参数
+    3.查询房屋信息：基本信息从房屋卡片缓存读取，详细信息从房屋详情缓存读取，没有缓存的房屋批量查询
+    4.响应结果：按照请求的顺序返回，不存在的房屋不返回
+    """
+
+    # 1.获取参数
+    ids = request.args.get('ids', '')
+    detail = request.args.get('detail', 'basic')
+
+    # 2.校验参数：先检查数量，过长的参数不再解析；去掉重复的房屋编号，保留请求的顺序
+    if detail not in ('basic', 'full'):
+        return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
+    raw_ids = ids.split(',')
+    if len(raw_ids) > constants.HOUSE_BATCH_MAX_COUNT:
+        return jsonify(errno=RET.PARAMERR, errmsg='最多查询%d个房屋' % constants.HOUSE_BATCH_MAX_COUNT)
+    house_ids = []
+    seen_ids = set()
+    try:
+        for house_id in raw_ids:
+            house_id = int(house_id)
+            if house_id not in seen_ids:
+                seen_ids.add(house_id)
+                house_ids.append(house_id)
+        fields = parse_fields(request.args.get('fields'),
+                              House.BASIC_FIELDS if detail == 'basic' else House.FULL_FIELDS)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
+
+    # 3.查询房屋信息
+    try:
+        if detail == 'basic':
+            houses_json = house_card.cards_json(house_ids, fields)
+        else:
+            details = load_house_details(house_ids)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='查询房屋数据失败')
+
+    # 4.响应结果
+    if detail == 'basic':
+        return raw_jsonify(houses_json)
+    return jsonify(errno=RET.OK, errmsg='OK',
+                   data=[pick_fields(details[house_id], fields) for house_id in house_ids if house_id in details])
+
+
+def load_house_details(house_ids):
+    """批量获取房屋的详细信息，返回 {房屋编号: 详细信息}
+    和load_house_detail使用同一份缓存：先一次MGET读取所有缓存，没有缓存或者已经过期的房屋一起查询后再写入缓存，
+    查询出现异常时使用过期的旧数据
+    """
+    keys = [constants.HOUSE_DETAIL_CACHE_KEY % house_id for house_id in house_ids]
+    try:
+        entries = read_caches(keys)
+    except Exception as e:
+        current_app.logger.error(e)
+        entries = [None] * len(keys)
+
+    details = {}
+    stale_details = {}
+    for house_id, entry in zip(house_ids, entries):
+        if entry and entry[0] > time.time():
+            details[house_id] = entry[1]
+        elif entry:
+            stale_details[house_id] = entry[1]
+
+    missing_ids = [house_id for house_id in house_ids if house_id not in details]
+    if not missing_ids:
+        return details
+    try:
+        loaded = query_house_details(missing_ids)
+    except Exception as e:
+        if not stale_details:
+            raise
+        current_app.logger.error(e)
+        details.update(stale_details)
+        return details
+
+    try:
+        write_caches([(constants.HOUSE_DETAIL_CACHE_KEY % house_id, house_dict) for house_id, house_dict in loaded.items()],
+                     constants.HOUSE_DETAIL_REDIS_EXPIRE_SECOND, constants.CACHE_STALE_REDIS_EXPIRES)
+    except Exception as e:
+        current_app.logger.error(e)
+    details.update(loaded)
+    return details
+
+
+def query_house_details(house_ids):
+    """查询房屋的详细信息，返回 {房屋编号: 详细信息}
+    房屋和房东一条SQL，图片、设施、评论各一条SQL，查询的数量不随房屋数量增加
+    关联的房东、评论的订单和用户只加载详细信息中使用的列
+    """
+    houses = House.query.filter(House.id.in_(house_ids)) \
+        .options(db.joinedload(House.user).load_only('name', 'avatar_url'), db.selectinload(House.images),
+                 db.selectinload(House.facilities)).all()
+    if not houses:
+        return {}
+
+    # 所有房屋的评论一起查询，每个房屋只查询最新的几条，再按房屋分组
+    comment_orders = dict((house.id, []) for house in houses)
+    latest_orders = latest_comment_order_ids(comment_orders.keys())
+    orders = Order.query.options(db.load_only('id', 'user_id', 'house_id', 'comment', 'update_time'),
+                                 db.joinedload(Order.user).load_only('name', 'mobile')) \
+        .join(latest_orders, Order.id == latest_orders.c.id) \
+        .order_by(Order.update_time.desc(), Order.id.desc())
+    for order in orders:
+        comment_orders[order.house_id].append(order)
+
+    return dict((house.id, house.to_full_dict(comment_orders[house.id])) for house in houses)
+
+def latest_comment_order_ids(house_ids):
+    """各个房屋最新的HOUSE_DETAIL_COMMENT_DISPLAY_COUNTS条评论的订单编号，作为子查询和订单表关联
+    每个房屋一个带LIMIT的子查询，使用UNION ALL合并，热门房屋的评论再多也只查询出需要展示的几条
+    每个子查询都包装成派生表，MySQL和SQLite都支持其中的ORDER BY和LIMIT
+    """
+    selects = []
+    for house_id in house_ids:
+        house_comments = db.select([Order.id]) \
+            .where(db.and_(Order.house_id == house_id, Order.status == 'COMPLETE', Order.comment != None)) \
+            .order_by(Order.update_time.desc(), Order.id.desc()) \
+            .limit(constants.HOUSE_DETAIL_COMMENT_DISPLAY_COUNTS).alias()
+        selects.append(db.select([house_comments.c.id]))
+    return db.union_all(*selects).alias('latest_comment_orders')
 
 """房屋图片的发布"""
 @api.route('/houses/image', methods=['POST'])
@@ -250,7 +638,8 @@ def upload_house_imaeg():
     house_image.url = key
 
     # 选择一个图片，作为房屋的默认图片
-    if not house.index_image_url:
+    index_image_changed = not house.index_image_url
+    if index_image_changed:
         house.index_image_url = key
 
     try:
@@ -261,6 +650,16 @@ def upload_house_imaeg():
         db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='存储房屋图片失败')
 
+    # 房屋详情中有房屋的所有图片，需要删除房屋详情的缓存
+    # 房屋列表和首页中展示的是默认图片，默认图片变化后需要删除房屋卡片，并使包含房屋卡片的房屋列表缓存失效
+    try:
+        redis_store.delete(constants.HOUSE_DETAIL_CACHE_KEY % house.id)
+        if index_image_changed:
+            house_card.delete_cards(house.id)
+            invalidate_house_list(house.area_id)
+    except Exception as e:
+        current_app.logger.error(e)
+
     # 5.响应结果：上传的房屋图片，需要立即刷新出来
     image_url = constants.QINIU_DOMIN_PREFIX + key
     return jsonify(errno=RET.OK, errmsg='发布房屋图片成功', data={'image_url':image_url})
@@ -324,20 +723,49 @@ def pub_house():
     house.min_days = min_days
     house.max_days = max_days
 
-    # 处理房屋的设施 facilities = [2,4,6]
-    facilities = json_dict.get('facility')
-    # 查询出被选中的设施模型对象
-    house.facilities = Facility.query.filter(Facility.id.in_(facilities)).all()
+    # 处理房屋的设施 facilities = [2,4,6]，使用缓存的设施编号过滤掉不存在的设施，不需要每次都查询设施表
+    try:
+        facility_ids = load_facility_ids()
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='查询设施信息失败')
+    try:
+        facilities = [int(facility_id) for facility_id in json_dict.get('facility') or []]
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.PARAMERR, errmsg='设施参数错误')
+    facilities = [facility_id for facility_id in set(facilities) if facility_id in facility_ids]
+    # 设施位图，搜索时按设施筛选使用
+    try:
+        house.facility_mask = facets.facility_mask(facilities)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.PARAMERR, errmsg='设施参数错误')
 
-    # 4.保存到数据库
+    # 4.保存到数据库：先flush生成房屋编号，再直接写入房屋和设施的关联
     try:
         db.session.add(house)
+        db.session.flush()
+        if facilities:
+            db.session.execute(house_facility.insert(),
+                               [{'house_id': house.id, 'facility_id': facility_id} for facility_id in facilities])
         db.session.commit()
     except Exception as e:
         current_app.logger.error(e)
         db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='发布新房源失败')
 
+    # 加入房屋列表索引、关键词索引和输入提示索引，使该城区的房屋列表缓存和分面统计失效，并重新生成首页数据，新发布的房源立即可以被搜索到
+    try:
+        listing_index.add_house(house)
+        search_index.add_house(house)
+        suggest_index.add_house(house.id, house.title, 0)
+        invalidate_house_list(house.area_id)
+        delete_house_facets(house.area_id)
+        load_house_index.refresh()
+    except Exception as e:
+        current_app.logger.error(e)
+
     # 5.响应结果
     return jsonify(errno=RET.OK, errmsg='发布新房源成功', data={'house_id':house.id})
 
@@ -346,36 +774,38 @@ def pub_house():
 def get_areas():
     """提供城区信息
     1.查询所有的城区信息
-    2.构造响应数据
-    3.响应结果
+    2.响应结果
     """
 
-    #  查询缓存数据，如果有缓存数据，就使用缓存数据，反之，就查询，并缓存新查询的数据
+    # 1.查询所有的城区信息：优先使用进程内缓存，其次使用redis缓存，缓存失效时只有一个请求查询数据库
     try:
-        area_dict_list = redis_store.get('Areas')
-        if area_dict_list:
-            return jsonify(errno=RET.OK, errmsg='OK', data=eval(area_dict_list))
-    except Exception as e:
-        current_app.logger.error(e)
-
-    # 1.查询所有的城区信息 areas == [Area,Area,Area,...]
-    try:
-        areas = Area.query.all()
+        areas_json = load_areas()
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='查询城区信息失败')
 
-    # 2.构造响应数据
+    # 2.响应结果：缓存的是序列化好的JSON，直接拼接到响应中，不需要解码再编码
+    # ETag使用响应体的摘要，城区信息在进程内缓存，客户端的缓存仍然有效时返回304，不再发送响应体
+    return conditional_response(raw_jsonify(areas_json), constants.AREA_CACHE_CONTROL)
+
+
+@local_cached('areas', constants.CATALOG_LOCAL_CACHE_EXPIRES)
+@cached(lambda: constants.AREA_CACHE_KEY, constants.AREA_INFO_REDIS_EXPIRES, raw=True)
+def load_areas():
+    """查询所有的城区信息，并构造响应数据，返回序列化好的JSON"""
+    # areas == [Area,Area,Area,...]
+    areas = Area.query.all()
+
     area_dict_list = []
     for area in areas:
         area_dict_list.append(area.to_dict())
+    return json_bytes(area_dict_list)
 
-    #  缓存城区信息到redis : 没有缓存成功也没有影响，因为前爱你会判断和查询
-    try:
-        redis_store.set('Areas', area_dict_list, constants.AREA_INFO_REDIS_EXPIRES)
-    except Exception as e:
-        current_app.logger.error(e)
-
-    # 3.响应结果
-    return jsonify(errno=RET.OK, errmsg='OK', data=area_dict_list)
 
+@local_cached('facilities', constants.CATALOG_LOCAL_CACHE_EXPIRES)
+@cached(lambda: constants.FACILITY_CACHE_KEY, constants.FACILITY_INFO_REDIS_EXPIRES)
+def load_facility_ids():
+    """查询所有的设施编号，有超出设施位图范围的编号时抛出异常，不缓存"""
+    facility_ids = [facility.id for facility in Facility.query.all()]
+    facets.check_facility_ids(facility_ids)
+    return facility_ids
@@ -3,12 +3,15 @@
 
 
 from . import api
-from iHome.utils.common import login_required
+from iHome.utils.common import login_required, parse_fields
 from flask import request,jsonify,current_app,g
 from iHome.utils.response_code import RET
 import datetime
 from iHome.models import House,Order
-from iHome import db
+from iHome import db, constants, redis_store
+from iHome.utils.cache_generation import invalidate_house_list
+from iHome.utils import availability, order_state, listing_index, suggest_index, house_card, read_queries
+from iHome.utils.pagination import encode_cursor, decode_cursor
 
 
 @api.route('/orders/<int:order_id>/comment', methods=['POST'])
@@ -17,10 +20,9 @@ def set_order_comment(order_id):
     """发表评价
     0.判断用户是否登录
     1.接受参数：order_id，comment，判断是否为空
-    2.查询要评价的订单
-    3.设置评价信息，修改订单状态
-    4.保存到数据库
-    5.响应结果
+    2.保存评价信息，修改订单状态：只有该订单的房客可以评价待评价的订单，同时房屋的订单数加1
+    3.保存到数据库
+    4.响应结果
     """
 
     # 1.接受参数：order_id，comment，判断是否为空
@@ -28,20 +30,17 @@ def set_order_comment(order_id):
     if not comment:
         return jsonify(errno=RET.PARAMERR, errmsg='缺少参数')
 
-    # 2.查询要评价的订单
+    # 2.保存评价信息，修改订单状态：一条UPDATE语句完成，不需要先查询订单
     try:
-        order = Order.query.filter(Order.id==order_id,Order.user_id==g.user_id,Order.status=='WAIT_COMMENT').first()
+        applied = order_state.transition(order_id, 'comment', g.user_id, comment=comment)
     except Exception as e:
         current_app.logger.error(e)
-        return jsonify(errno=RET.DBERR, errmsg='查询订单数据失败')
-    if not order:
+        db.session.rollback()
+        return jsonify(errno=RET.DBERR, errmsg='保存评价信息失败')
+    if not applied:
         return jsonify(errno=RET.NODATA, errmsg='订单不存在')
 
-    # 3.设置评价信息，修改订单状态
-    order.comment = comment
-    order.status = 'COMPLETE'
-
-    # 4.更新数据到数据库
+    # 3.更新数据到数据库
     try:
         db.session.commit()
     except Exception as e:
@@ -49,7 +48,22 @@ def set_order_comment(order_id):
         db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='保存评价信息失败')
 
-    # 5.响应结果
+    # 房屋详情中展示了评论信息，需要删除房屋详情的缓存
+    # 订单完成后房屋的订单数增加，需要删除房屋卡片；按订单量排序的结果会变化，需要更新房屋列表索引，并使该城区的房屋列表缓存失效
+    # 输入提示按订单数排序，需要更新房屋和城区的权重
+    try:
+        house_id, area_id, title, order_count = \
+            db.session.query(House.id, House.area_id, House.title, House.order_count) \
+            .join(Order, Order.house_id == House.id).filter(Order.id == order_id).one()
+        redis_store.delete(constants.HOUSE_DETAIL_CACHE_KEY % house_id, house_card.card_key(house_id))
+        listing_index.update_order_count(house_id, area_id, order_count)
+        suggest_index.add_house(house_id, title, order_count)
+        suggest_index.increment_area(area_id)
+        invalidate_house_list(area_id)
+    except Exception as e:
+        current_app.logger.error(e)
+
+    # 4.响应结果
     return jsonify(errno=RET.OK, errmsg='OK')
 
 
@@ -58,45 +72,45 @@ def set_order_comment(order_id):
 def set_order_status(order_id):
     """确认订单
     0.判断是否登录
-    1.查询order_id对应的订单信息
-    2.判断当前登录使用是否是该订单的房东
-    3.修改订单的status属性为"已接单"
-    4.更新数据到数据库
-    5.响应结果
+    1.接受参数：action，拒单时还需要拒单理由
+    2.修改订单状态：只有该订单的房东可以修改待接单的订单
+    3.更新数据到数据库
+    4.响应结果
     """
 
-    # 获取action
+    # 1.获取action
     action = request.args.get('action')
     if action not in ['accept', 'reject']:
         return jsonify(errno=RET.PARAMERR, errmsg='缺少参数')
 
-    # 1.查询order_id对应的订单信息
+    values = {}
+    if action == 'reject':
+        # 保存拒单理由
+        reason = request.json.get('reason')
+        if not reason:
+            return jsonify(errno=RET.PARAMERR, errmsg='缺少拒单理由')
+        values['comment'] = reason # 一旦被拒单，就无法评价，可以使用一个字段复用
+
+    # 2.修改订单状态：订单状态和房东的判断都在同一条UPDATE语句中，房客同时操作时不会互相覆盖
     try:
-        order = Order.query.filter(Order.id==order_id, Order.status=='WAIT_ACCEPT').first()
+        applied = order_state.transition(order_id, action, g.user_id, **values)
     except Exception as e:
         current_app.logger.error(e)
-        return jsonify(errno=RET.DBERR, errmsg='查询订单数据失败')
-    if not order:
-        return jsonify(errno=RET.NODATA, errmsg='订单不存在')
+        db.session.rollback()
+        return jsonify(errno=RET.DBERR, errmsg='保存订单状态失败')
 
-    # 2.判断当前登录用户是否是该订单的房东
-    login_user_id = g.user_id
-    landlord_user_id = order.house.user_id
-    if login_user_id != landlord_user_id:
+    if not applied:
+        # 修改失败时再区分订单不存在和当前登录用户不是该订单的房东
+        try:
+            order = Order.query.filter(Order.id==order_id, Order.status=='WAIT_ACCEPT').first()
+        except Exception as e:
+            current_app.logger.error(e)
+            return jsonify(errno=RET.DBERR, errmsg='查询订单数据失败')
+        if not order:
+            return jsonify(errno=RET.NODATA, errmsg='订单不存在')
         return jsonify(errno=RET.USERERR, errmsg='权限不够')
 
-    # 3.修改订单的status属性为"已接单"
-    if action == 'accept':
-        order.status = 'WAIT_COMMENT'
-    else:
-        order.status = 'REJECTED'
-        # 保存拒单理由
-        reason = request.json.get('reason')
-        if not reason:
-            return jsonify(errno=RET.PARAMERR, errmsg='缺少拒单理由')
-        order.comment = reason # 一旦被拒单，就无法评价，可以使用一个字段复用
-
-    # 4.更新数据到数据库
+    # 3.更新数据到数据库
     try:
         db.session.commit()
     except Exception as e:
@@ -104,7 +118,16 @@ def set_order_status(order_id):
         db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='保存订单状态失败')
 
-    # 5.响应结果
+    # 拒单后房屋在该时间段重新可以预订，需要释放预订日历，并使该城区的房屋列表缓存失效
+    if action == 'reject':
+        try:
+            order = Order.query.options(db.joinedload(Order.house)).get(order_id)
+            availability.release(order.house_id, order.begin_date, order.end_date)
+            invalidate_house_list(order.house.area_id)
+        except Exception as e:
+            current_app.logger.error(e)
+
+    # 4.响应结果
     return jsonify(errno=RET.OK, errmsg='OK')
 
 
@@ -113,10 +136,13 @@ def set_order_status(order_id):
 def get_order_list():
     """获取我的订单
     0.判断是否登录
-    1.获取参数：user_id = g.user_id
-    2.查询该登录用户的所有的订单信息
+    1.获取参数：user_id = g.user_id，订单状态和分页游标
+    2.查询该登录用户的一页订单信息，第一页同时统计各个状态的订单数量
     3.构造响应数据
     4.响应结果
+
+    分页使用游标：传入上一页响应中的next_cursor，第一页不传
+    fields 订单需要的字段(以逗号分隔)，如 fields=order_id,status，不传时返回所有字段，查询时只加载需要的列
     """
 
     # 获取用户身份信息
@@ -124,31 +150,64 @@ def get_order_list():
     if role not in ['custom', 'landlord']:
         return jsonify(errno=RET.PARAMERR, errmsg='缺少必传参数')
 
+    # 获取订单状态，不传表示所有状态
+    status = request.args.get('status')
+    # 获取游标，游标中保存的是上一页最后一个订单的编号
+    cursor = request.args.get('cursor')
+    last_order_id = None
+    try:
+        assert not status or status in Order.status.type.enums, Exception('订单状态有误')
+        if cursor:
+            last_order_id, = decode_cursor(cursor)
+            last_order_id = int(last_order_id)
+        fields = parse_fields(request.args.get('fields'), Order.DICT_FIELDS)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.PARAMERR, errmsg='参数有误')
+
     # 1.获取参数：user_id = g.user_id
     user_id = g.user_id
 
-    # 2.查询该登录用户的所有的订单信息
+    # 2.查询该登录用户的订单信息：房东的订单通过房屋关联查询，订单和房屋在同一条SQL中查询出来
+    # 订单列表只读，使用Core查询得到结果行，不创建Order和House对象
     try:
         if role == 'custom':
-            orders = Order.query.filter(Order.user_id==user_id).all()
+            order_filter = Order.user_id == user_id
         else:
-            # 查询该登录用户发布的房屋信息
-            houses = House.query.filter(House.user_id==user_id).all()
-            # 获取发布的房屋的ids
-            house_ids = [house.id for house in houses]
-            # 从订单中查询出订单中的house_id在house_ids
-            orders = Order.query.filter(Order.house_id.in_(house_ids)).all()
+            order_filter = House.user_id == user_id
+
+        page_filter = order_filter
+        if status:
+            page_filter = db.and_(page_filter, Order.status == status)
+        if last_order_id:
+            page_filter = db.and_(page_filter, Order.id < last_order_id)
+        # 多查询一条数据，用来判断是否还有下一页；订单和房屋只查询需要的字段使用的列
+        orders = read_queries.order_rows(page_filter, fields, constants.ORDER_LIST_PAGE_CAPACITY + 1)
+
+        # 各个状态的订单数量只在第一页统计，一条分组查询完成
+        status_counts = None
+        if not cursor:
+            status_counts = read_queries.order_status_counts(order_filter)
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='查询订单失败')
 
+    next_cursor = None
+    if len(orders) > constants.ORDER_LIST_PAGE_CAPACITY:
+        orders = orders[:constants.ORDER_LIST_PAGE_CAPACITY]
+        next_cursor = encode_cursor(orders[-1].id)
+
     # 3.构造响应数据
-    order_dict_list = []
-    for order in orders:
-        order_dict_list.append(order.to_dict())
+    order_dict_list = read_queries.order_dicts(orders, fields)
+
+    response_data = {
+        'orders': order_dict_list,
+        'next_cursor': next_cursor,
+        'status_counts': status_counts
+    }
 
     # 4.响应结果
-    return jsonify(errno=RET.OK, errmsg='OK',data=order_dict_list)
+    return jsonify(errno=RET.OK, errmsg='OK', data=response_data)
 
 
 @api.route('/orders', methods=['POST'])
@@ -157,10 +216,10 @@ def create_order():
     """创建、提交订单
     0.判断用户是否登录
     1.接受参数，house_id, 入住时间和离开时间
-    2.校验参数，判断入住时间和离开是否符合逻辑，校验房屋是否存在
-    3.判断当前房屋有没有被预定
+    2.校验参数，判断入住时间和离开是否符合逻辑
+    3.锁住房屋记录，判断当前房屋有没有被预定
     4.创建订单模型对象，并存储订单数据
-    5.保存到数据库
+    5.保存到数据库，提交后释放房屋记录的锁
     6.响应结果
     """
 
@@ -175,33 +234,41 @@ def create_order():
 
     # 2.校验参数，判断入住时间和离开是否符合逻辑，校验房屋是否存在
     try:
+        house_id = int(house_id)
         start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d')
         end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d')
         # 自己校验入住时间是否小于离开的时间
         if start_date and end_date:
             # 断言：入住时间一定小于离开时间，如果不满足，就抛出异常
             assert start_date < end_date, Exception('入住时间有误')
+            assert (end_date - start_date).days <= constants.HOUSE_BOOKING_MAX_DAYS, Exception('入住时间段过长')
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.PARAMERR, errmsg='入住时间有误')
 
-    # 判断房屋是否存在
+    # 3.判断房屋是否存在：使用SELECT ... FOR UPDATE锁住房屋记录，直到订单提交或者回滚
+    # 同一房屋的预订依次检查冲突和创建订单，不会同时预订成功；不同房屋的预订互不影响
     try:
-        house = House.query.get(house_id)
+        house = House.query.filter(House.id == house_id).with_for_update().first()
     except Exception as e:
         current_app.logger.error(e)
+        db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='查询房屋数据失败')
     if not house:
+        db.session.rollback()
         return jsonify(errno=RET.NODATA, errmsg='房屋不存在')
 
-    # 3.判断当前房屋有没有被预定
+    # 持有房屋的锁之后以订单表为准检查冲突；预订日历只在订单提交后尽量更新，可能和订单表不一致，不作为判断依据
     try:
-        conflict_orders = Order.query.filter(Order.house_id==house_id,end_date > Order.begin_date, start_date < Order.end_date).all()
+        conflict_order = Order.query.filter(Order.house_id==house_id,end_date > Order.begin_date, start_date < Order.end_date,
+                                            Order.status.notin_(Order.RELEASED_STATUSES)).first()
     except Exception as e:
         current_app.logger.error(e)
+        db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='查询冲突订单失败')
     # 如果有值，说明要预订的房屋在该时间节点，已经在订单中，说明被预定
-    if conflict_orders:
+    if conflict_order:
+        db.session.rollback()
         return jsonify(errno=RET.DATAERR, errmsg='房屋已被预订')
 
     # 4.创建订单模型对象，并存储订单数据
@@ -224,5 +291,12 @@ def create_order():
         db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='保存订单数据失败')
 
+    # 房屋在该时间段已被预订，需要更新预订日历，并使该城区的房屋列表缓存失效
+    try:
+        availability.book(house.id, start_date, end_date)
+        invalidate_house_list(house.area_id)
+    except Exception as e:
+        current_app.logger.error(e)
+
     # 6.响应结果
     return jsonify(errno=RET.OK, errmsg='OK')
\ No newline at end of file
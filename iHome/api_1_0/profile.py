@@ -7,8 +7,10 @@ from flask import session, current_app, jsonify, request, g
 from iHome.models import User,House
 from iHome.utils.response_code import RET
 from iHome.utils.image_storage import upload_image
-from iHome import db, constants
-from iHome.utils.common import login_required
+from iHome import db, constants, redis_store
+from iHome.utils.common import login_required, raw_jsonify
+from iHome.utils import house_card
+from iHome.utils.cache_generation import invalidate_house_list
 
 
 @api.route('/users/houses')
@@ -25,20 +27,18 @@ def get_user_hosues():
     # 1.获取当前登录用户的user_id
     user_id = g.user_id
 
-    # 2.使用user_id查询该登录用户发布的所有的房源
+    # 2.使用user_id查询该登录用户发布的所有的房源编号
+    # 3.构造响应数据：房屋信息从房屋卡片缓存中批量读取，已经是序列化好的JSON
     try:
-        houses = House.query.filter(House.user_id==user_id).all()
+        house_ids = [house_id for house_id, in db.session.query(House.id).filter(House.user_id==user_id)
+                     .order_by(House.id)]
+        houses_json = house_card.cards_json(house_ids)
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='查询房屋数据失败')
 
-    # 3.构造响应数据
-    house_dict_list = []
-    for house in houses:
-        house_dict_list.append(house.to_basic_dict())
-
     # 4.响应结果
-    return jsonify(errno=RET.OK, errmsg='OK', data=house_dict_list)
+    return raw_jsonify(houses_json)
 
 """查询用户是已认证"""
 @api.route('/users/auth', methods=['GET'])
@@ -159,6 +159,9 @@ def set_user_name():
         db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='存储用户名失败')
 
+    # 房屋详情中展示了房东的用户名，需要删除该用户发布的房屋的详情缓存
+    delete_house_caches(user)
+
     # 修改用户名时，好需要修改session里面的name
     session['name'] = new_name
 
@@ -215,6 +218,9 @@ def upload_avatar():
         db.session.rollback()
         return jsonify(errno=RET.DBERR, errmsg='存储用户头像地址失败')
 
+    # 房屋详情和房屋卡片中展示了房东的头像，需要删除该用户发布的房屋的详情缓存和房屋卡片
+    delete_house_caches(user, cards=True)
+
     # 4.响应上传结果，在结果中传入avatar_url，方便用户上传完成后立即刷新头像
     # 拼接访问头像的全路径
     # http://oyucyko3w.bkt.clouddn.com/FtEAyyPRhUT8SU3f5DNPeejBjMV5
@@ -251,3 +257,18 @@ def get_user_info():
 
     # 4.响应数据
     return jsonify(errno=RET.OK, errmsg='OK', data=response_data)
+
+
+def delete_house_caches(user, cards=False):
+    """删除用户发布的所有房屋的详情缓存，cards为True时同时删除房屋卡片，并使这些房屋所在城区的房屋列表缓存失效"""
+    try:
+        keys = [constants.HOUSE_DETAIL_CACHE_KEY % house.id for house in user.houses]
+        if cards:
+            keys += [house_card.card_key(house.id) for house in user.houses]
+        if keys:
+            redis_store.delete(*keys)
+        if cards:
+            for area_id in set(house.area_id for house in user.houses):
+                invalidate_house_list(area_id)
+    except Exception as e:
+        current_app.logger.error(e)
@@ -0,0 +1,214 @@
+# -*- coding:utf-8 -*-
+# 命令行管理命令，在manage.py中注册到脚本管理器
+
+
+import re
+import sys
+import ast
+import json
+from flask_script import Manager
+import iHome
+from iHome import constants, db
+from iHome.models import Area, House, Order, Facility, house_facility
+from iHome.utils import cache_codec, local_cache, availability, listing_index, search_index, suggest_index, facets, \
+    house_card
+from iHome.utils.cache_generation import bump_generation, HOUSE_LIST, ALL_AREAS
+
+
+CacheCommand = Manager(usage='Perform redis cache operations')
+AvailabilityCommand = Manager(usage='Maintain the booking calendar index')
+HouseCommand = Manager(usage='Maintain house data')
+
+
+def key_namespace(key):
+    """获取缓存key所属的命名空间：house_list_1_2018-04-07_... -> house_list，ImageCode:xxx -> ImageCode"""
+    if not isinstance(key, str):
+        key = key.decode('utf-8')
+    match = re.match(r'[A-Za-z]+(_[a-z]+)?', key)
+    return match.group() if match else key
+
+
+def key_memory(key):
+    """获取key占用的内存字节数，redis版本低于4.0时使用序列化后的长度估算"""
+    try:
+        return iHome.redis_store.execute_command('MEMORY', 'USAGE', key) or 0
+    except Exception:
+        return len(iHome.redis_store.dump(key) or b'')
+
+
+def key_values(key):
+    """获取字符串或者哈希类型的key中保存的所有内容"""
+    key_type = iHome.redis_store.type(key)
+    if key_type == b'string':
+        return [iHome.redis_store.get(key)]
+    if key_type == b'hash':
+        return iHome.redis_store.hvals(key)
+    return []
+
+
+def decode_value(value):
+    """解析缓存内容，兼容带有效期前缀的缓存、已经序列化好的JSON和以前使用str()写入的内容，无法解析时返回None"""
+    if re.match(br'\d+:', value):
+        value = value.partition(b':')[2]
+    try:
+        return cache_codec.loads(value)
+    except Exception:
+        pass
+    try:
+        return json.loads(value.decode('utf-8'))
+    except Exception:
+        pass
+    try:
+        if not isinstance(value, str):
+            value = value.decode('utf-8')
+        return ast.literal_eval(value)
+    except Exception:
+        return None
+
+
+@CacheCommand.command
+def report():
+    """按命名空间统计缓存占用的内存，以及内容使用str()和cache_codec编码时的字节数"""
+    stats = {}
+    for key in iHome.redis_store.scan_iter(count=1000):
+        namespace = key_namespace(key)
+        stat = stats.setdefault(namespace, {'keys': 0, 'memory': 0, 'legacy': 0, 'codec': 0})
+        stat['keys'] += 1
+        stat['memory'] += key_memory(key)
+        for value in key_values(key):
+            data = decode_value(value)
+            if data is None:
+                continue
+            stat['legacy'] += len(str(data))
+            stat['codec'] += len(cache_codec.dumps(data))
+
+    print('%-20s %10s %15s %15s %15s' % ('namespace', 'keys', 'memory(bytes)', 'str()(bytes)', 'codec(bytes)'))
+    for namespace in sorted(stats):
+        stat = stats[namespace]
+        print('%-20s %10d %15d %15d %15d' % (namespace, stat['keys'], stat['memory'], stat['legacy'], stat['codec']))
+
+
+@CacheCommand.command
+def reload_catalogs():
+    """城区或者设施数据修改后，删除redis缓存并通知所有进程删除进程内缓存"""
+    iHome.redis_store.delete(constants.AREA_CACHE_KEY, constants.FACILITY_CACHE_KEY)
+    local_cache.publish_invalidate('areas', 'facilities')
+    print('catalog caches invalidated')
+    check_facility_catalog()
+
+
+def check_facility_catalog():
+    """设施表中有超出设施位图范围的编号时输出错误并退出，发布房源、按设施搜索和分面统计都会失败"""
+    try:
+        facets.check_facility_ids([facility_id for facility_id, in db.session.query(Facility.id)])
+    except ValueError as e:
+        print('error: %s' % e)
+        sys.exit(1)
+
+
+@AvailabilityCommand.command
+def rebuild():
+    """根据订单数据重新生成预订日历索引"""
+    order_count, night_count = availability.rebuild()
+    print('indexed %d orders into %d nights' % (order_count, night_count))
+
+
+@HouseCommand.option('-b', '--batch-size', dest='batch_size', type=int, default=500,
+                     help='number of houses updated per transaction')
+def backfill_order_count(batch_size):
+    """根据已完成的订单重新计算房屋的订单数
+    按房屋编号分批更新，每批单独提交，不会长时间锁住房屋表
+    订单数变化的房屋同时更新订单量排序的列表索引、输入提示的权重，删除房屋卡片和详情的缓存，
+    最后使这些城区的房屋列表缓存失效
+    """
+    max_house_id = db.session.query(db.func.max(House.id)).scalar() or 0
+    complete_count = db.session.query(db.func.count(Order.id)) \
+        .filter(Order.house_id == House.id, Order.status == 'COMPLETE').correlate(House).as_scalar()
+
+    updated = 0
+    changed_area_ids = set()
+    for start in range(1, max_house_id + 1, batch_size):
+        batch_filter = db.and_(House.id >= start, House.id < start + batch_size)
+        old_counts = dict(db.session.query(House.id, House.order_count).filter(batch_filter))
+        updated += House.query.filter(batch_filter).update({'order_count': complete_count}, synchronize_session=False)
+        db.session.commit()
+
+        changed = [house for house in db.session.query(House.id, House.area_id, House.title, House.order_count)
+                   .filter(batch_filter) if house.order_count != old_counts.get(house.id)]
+        for house in changed:
+            listing_index.update_order_count(house.id, house.area_id, house.order_count)
+            suggest_index.add_house(house.id, house.title, house.order_count)
+            changed_area_ids.add(house.area_id)
+        if changed:
+            house_ids = [house.id for house in changed]
+            house_card.delete_cards(*house_ids)
+            iHome.redis_store.delete(*[constants.HOUSE_DETAIL_CACHE_KEY % house_id for house_id in house_ids])
+
+    # 城区输入提示的权重是城区内房屋订单数的和
+    if changed_area_ids:
+        area_weights = db.session.query(House.area_id, db.func.sum(House.order_count)) \
+            .filter(House.area_id.in_(changed_area_ids)).group_by(House.area_id)
+        for area_id, weight in area_weights:
+            suggest_index.update_area_weight(area_id, int(weight or 0))
+        bump_generation(HOUSE_LIST, *(sorted(changed_area_ids) + [ALL_AREAS]))
+    print('updated order_count of %d houses, %d areas changed' % (updated, len(changed_area_ids)))
+
+
+@HouseCommand.option('-b', '--batch-size', dest='batch_size', type=int, default=500,
+                     help='number of houses updated per transaction')
+def backfill_facility_mask(batch_size):
+    """根据ih_house_facility重新计算房屋的设施位图，删除分面统计的缓存，并使所有城区的房屋列表缓存失效
+    按房屋编号分批更新，每批单独提交，不会长时间锁住房屋表
+    """
+    # 超出范围的设施编号会使位图溢出，先检查设施表
+    check_facility_catalog()
+    max_house_id = db.session.query(db.func.max(House.id)).scalar() or 0
+    # 设施编号各不相同，各设施对应位的和就是按位或的结果
+    facility_bit = db.literal_column('1').op('<<')(house_facility.c.facility_id)
+    mask = db.session.query(db.func.coalesce(db.func.sum(facility_bit), 0)) \
+        .filter(house_facility.c.house_id == House.id).correlate(House).as_scalar()
+
+    updated = 0
+    for start in range(1, max_house_id + 1, batch_size):
+        updated += House.query.filter(House.id >= start, House.id < start + batch_size) \
+            .update({'facility_mask': mask}, synchronize_session=False)
+        db.session.commit()
+
+    for key in iHome.redis_store.scan_iter(constants.HOUSE_FACETS_CACHE_KEY % '*', count=1000):
+        iHome.redis_store.delete(key)
+    # 按设施筛选的搜索结果和总数是使用旧的位图计算的
+    area_ids = [area_id for area_id, in db.session.query(Area.id).order_by(Area.id)]
+    bump_generation(HOUSE_LIST, *(area_ids + [ALL_AREAS]))
+    print('updated facility_mask of %d houses' % updated)
+
+
+@HouseCommand.command
+def rebuild_listing():
+    """根据房屋表重新生成房屋列表索引"""
+    house_count = listing_index.rebuild()
+    print('indexed %d houses' % house_count)
+
+
+@HouseCommand.command
+def rebuild_search():
+    """根据房屋表重新生成关键词索引"""
+    house_count = search_index.rebuild()
+    print('indexed %d houses' % house_count)
+
+
+@HouseCommand.command
+def rebuild_suggest():
+    """根据城区表和房屋表重新生成输入提示索引"""
+    area_count, house_count = suggest_index.rebuild()
+    print('indexed %d areas and %d houses' % (area_count, house_count))
+
+
+@HouseCommand.command
+def check_listing():
+    """检查房屋列表索引和房屋表是否一致，不一致时以非0状态退出"""
+    problems = listing_index.check()
+    for key, member, actual, expected in problems[:100]:
+        print('%s %s index=%s table=%s' % (key, member, actual, expected))
+    print('%d inconsistent entries' % len(problems))
+    if problems:
+        sys.exit(1)
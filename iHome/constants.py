@@ -29,3 +29,77 @@ HOUSE_LIST_PAGE_CAPACITY = 2
 
 # 房屋列表页面Redis缓存时间，单位：秒
 HOUSE_LIST_REDIS_EXPIRES = 7200
+
+# 房屋列表总数Redis缓存时间，单位：秒
+HOUSE_LIST_COUNT_REDIS_EXPIRES = 600
+
+# 房屋搜索分面统计的价格区间分界，单位：元，例如[100, 200]表示0-100、100-200、200以上三个区间
+HOUSE_PRICE_FACET_BOUNDS = [100, 200, 300, 500, 1000]
+
+# 房屋搜索分面统计(各价格区间、各设施的房屋数量)Redis缓存时间，单位：秒
+HOUSE_FACETS_REDIS_EXPIRES = 3600
+
+# 房屋搜索关键词的最大长度
+HOUSE_SEARCH_KEYWORD_MAX_LENGTH = 32
+
+# 关键词搜索结果(按排序方式排好序的房屋编号)Redis缓存时间，单位：秒，用于后续翻页
+SEARCH_RESULT_REDIS_EXPIRES = 120
+
+# 按日期搜索时从预订日历索引中读取的已被预订房屋的最大数量，超过时使用数据库的NOT EXISTS子查询
+# 读取列表索引的一页时每个已被预订的房屋都要查询一次名次，这个数量不能太大
+HOUSE_SEARCH_BOOKED_MAX_COUNT = 200
+
+# 搜索和预订的入住时间段最多的天数，预订日历每一晚一个位图，时间段越长需要读写的位图越多
+HOUSE_BOOKING_MAX_DAYS = 90
+
+# 关键词搜索使用数据库查询时，从倒排索引中读取的房屋编号的最大数量，超过时使用LIKE查询
+HOUSE_SEARCH_KEYWORD_MAX_MATCHES = 1000
+
+# 搜索框输入提示：建立索引的最大前缀长度，每个前缀保留的提示数量，每次返回的提示数量
+SUGGEST_PREFIX_MAX_LENGTH = 10
+SUGGEST_PREFIX_CAPACITY = 10
+SUGGEST_MAX_COUNT = 8
+
+# 批量查询房屋信息时一次最多查询的房屋数量
+HOUSE_BATCH_MAX_COUNT = 50
+
+# 订单列表每页显示条目数
+ORDER_LIST_PAGE_CAPACITY = 20
+
+# 设施信息redis缓存时间，单位：秒
+FACILITY_INFO_REDIS_EXPIRES = 7200
+
+# 城区信息、设施信息进程内缓存的有效期，单位：秒
+# 数据变化时会通知所有进程删除缓存，有效期只用于防止错过通知后一直使用旧数据
+CATALOG_LOCAL_CACHE_EXPIRES = 600
+
+# 每个进程在日志中输出进程内缓存命中统计的间隔，单位：秒
+LOCAL_CACHE_STATS_INTERVAL = 300
+
+# 房屋卡片(房屋列表中展示的房屋基本信息)Redis缓存时间，单位：秒
+HOUSE_CARD_REDIS_EXPIRES = 86400
+
+# 城区信息、设施信息、首页房屋、房屋详情、房屋卡片、分面统计的缓存key
+AREA_CACHE_KEY = 'area_list_json'  # 保存的是序列化好的JSON，和以前的Areas格式不同
+FACILITY_CACHE_KEY = 'Facilities'
+HOUSE_INDEX_CACHE_KEY = 'house_index'
+HOUSE_DETAIL_CACHE_KEY = 'house_detail_%s'
+HOUSE_CARD_CACHE_KEY = 'house_card:%s'
+HOUSE_FACETS_CACHE_KEY = 'house_facets_%s'
+
+# 缓存过期后还可以作为旧数据使用的时间(重新查询期间或者数据库异常时使用)，单位：秒
+CACHE_STALE_REDIS_EXPIRES = 3600
+
+# 重新查询缓存数据的锁的有效期，单位：秒
+CACHE_LOCK_EXPIRES = 10
+
+# 没有获取到锁时，等待缓存写入的次数和每次等待的时间，单位：秒
+CACHE_LOCK_WAIT_TIMES = 20
+CACHE_LOCK_WAIT_INTERVAL = 0.05
+
+# 读接口响应的Cache-Control，公开的接口可以由nginx/CDN缓存，public的响应不保存session、不输出Set-Cookie
+# 房屋详情的响应中带有登录用户的编号，只能由浏览器缓存，每次使用前都要使用ETag验证
+AREA_CACHE_CONTROL = 'public, max-age=3600'
+HOUSE_INDEX_CACHE_CONTROL = 'public, max-age=60'
+HOUSE_LIST_CACHE_CONTROL = 'public, max-age=60'
+HOUSE_DETAIL_CACHE_CONTROL = 'private, no-cache'
@@ -2,6 +2,7 @@
 #ihome所使用的所有模型
 
 from datetime import datetime
+from sqlalchemy import and_, exists
 from werkzeug.security import generate_password_hash, check_password_hash
 from iHome import constants
 from . import db
@@ -93,12 +94,20 @@ class House(BaseModel, db.Model):
     """房屋信息"""
 
     __tablename__ = "ih_house_info"
+    __table_args__ = (
+        # 房屋搜索：按城区筛选，再按发布时间/价格/订单量排序
+        db.Index("ix_ih_house_info_area_id_create_time", "area_id", "create_time"),
+        db.Index("ix_ih_house_info_area_id_price", "area_id", "price"),
+        db.Index("ix_ih_house_info_area_id_order_count", "area_id", "order_count"),
+        # 首页和不限城区的搜索：直接按排序字段取前几条
+        db.Index("ix_ih_house_info_create_time", "create_time"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)  # 房屋编号
-    user_id = db.Column(db.Integer, db.ForeignKey("ih_user_profile.id"), nullable=False)  # 房屋主人的用户编号
+    user_id = db.Column(db.Integer, db.ForeignKey("ih_user_profile.id"), nullable=False, index=True)  # 房屋主人的用户编号
     area_id = db.Column(db.Integer, db.ForeignKey("ih_area_info.id"), nullable=False)  # 归属地的区域编号
     title = db.Column(db.String(64), nullable=False)  # 标题
-    price = db.Column(db.Integer, default=0)  # 单价，单位：分
+    price = db.Column(db.Integer, default=0, index=True)  # 单价，单位：分
     address = db.Column(db.String(512), default="")  # 地址
     room_count = db.Column(db.Integer, default=1)  # 房间数目
     acreage = db.Column(db.Integer, default=0)  # 房屋面积
@@ -108,30 +117,63 @@ class House(BaseModel, db.Model):
     deposit = db.Column(db.Integer, default=0)  # 房屋押金
     min_days = db.Column(db.Integer, default=1)  # 最少入住天数
     max_days = db.Column(db.Integer, default=0)  # 最多入住天数，0表示不限制
-    order_count = db.Column(db.Integer, default=0)  # 预订完成的该房屋的订单数
+    order_count = db.Column(db.Integer, default=0, index=True)  # 预订完成的该房屋的订单数
     index_image_url = db.Column(db.String(256), default="")  # 房屋主图片的路径
+    # 房屋设施的位图，第n位为1表示房屋有编号为n的设施，按设施筛选时不需要关联ih_house_facility
+    facility_mask = db.Column(db.BigInteger, default=0, server_default="0", nullable=False)
     facilities = db.relationship("Facility", secondary=house_facility)  # 房屋的设施
     images = db.relationship("HouseImage")  # 房屋的图片
     orders = db.relationship("Order", backref="house")  # 房屋的订单
 
+    # to_basic_dict的字段，以及生成时需要从房屋表加载的列(城区的名字和房东的头像通过关联加载)
+    BASIC_FIELDS = ("house_id", "title", "price", "area_name", "img_url", "room_count", "order_count", "address",
+                    "user_avatar", "ctime")
+    BASIC_COLUMNS = ("id", "user_id", "area_id", "title", "price", "index_image_url", "room_count", "order_count",
+                     "address", "create_time")
+    # to_full_dict的字段
+    FULL_FIELDS = ("hid", "user_id", "user_name", "user_avatar", "title", "price", "address", "room_count", "acreage",
+                   "unit", "capacity", "beds", "deposit", "min_days", "max_days", "img_urls", "facilities", "comments")
+
+    @staticmethod
+    def available_filter(start_date=None, end_date=None):
+        """构造房屋在入住时间段内没有冲突订单的过滤条件
+        使用与House.id关联的NOT EXISTS子查询，由数据库按外层查询(如城区)筛选出的房屋逐个判断，
+        不需要把冲突订单加载到Python中再拼接NOT IN列表
+        """
+        conflict_filters = [Order.house_id == House.id, Order.status.notin_(Order.RELEASED_STATUSES)]
+        if end_date:
+            conflict_filters.append(Order.begin_date < end_date)
+        if start_date:
+            conflict_filters.append(Order.end_date > start_date)
+        return ~exists().where(and_(*conflict_filters))
+
     def to_basic_dict(self):
         """将基本信息转换为字典数据"""
+        return House.basic_dict(self, self.area.name, self.user.avatar_url)
+
+    @staticmethod
+    def basic_dict(house, area_name, avatar_url):
+        """基本信息的字典数据
+        house可以是House对象，也可以是包含房屋表中BASIC_COLUMNS列的查询结果行，两者生成的数据完全相同
+        """
         house_dict = {
-            "house_id": self.id,
-            "title": self.title,
-            "price": self.price,
-            "area_name": self.area.name,
-            "img_url": constants.QINIU_DOMIN_PREFIX + self.index_image_url if self.index_image_url else "",
-            "room_count": self.room_count,
-            "order_count": self.order_count,
-            "address": self.address,
-            "user_avatar": constants.QINIU_DOMIN_PREFIX + self.user.avatar_url if self.user.avatar_url else "",
-            "ctime": self.create_time.strftime("%Y-%m-%d")
+            "house_id": house.id,
+            "title": house.title,
+            "price": house.price,
+            "area_name": area_name,
+            "img_url": constants.QINIU_DOMIN_PREFIX + house.index_image_url if house.index_image_url else "",
+            "room_count": house.room_count,
+            "order_count": house.order_count,
+            "address": house.address,
+            "user_avatar": constants.QINIU_DOMIN_PREFIX + avatar_url if avatar_url else "",
+            "ctime": house.create_time.strftime("%Y-%m-%d")
         }
         return house_dict
 
-    def to_full_dict(self):
-        """将详细信息转换为字典数据"""
+    def to_full_dict(self, comment_orders=None):
+        """将详细信息转换为字典数据
+        comment_orders: 已经查询好的带评论的订单，批量转换多个房屋时传入，为None时单独查询
+        """
         house_dict = {
             "hid": self.id,
             "user_id": self.user_id,
@@ -164,9 +206,13 @@ class House(BaseModel, db.Model):
 
         # 评论信息
         comments = []
-        orders = Order.query.filter(Order.house_id == self.id, Order.status == "COMPLETE", Order.comment != None) \
-            .order_by(Order.update_time.desc()).limit(constants.HOUSE_DETAIL_COMMENT_DISPLAY_COUNTS)
-        for order in orders:
+        if comment_orders is None:
+            # 评论的用户随订单一起查询出来，避免每条评论再单独查询一次用户
+            comment_orders = Order.query.options(db.joinedload(Order.user)) \
+                .filter(Order.house_id == self.id, Order.status == "COMPLETE", Order.comment != None) \
+                .order_by(Order.update_time.desc(), Order.id.desc()) \
+                .limit(constants.HOUSE_DETAIL_COMMENT_DISPLAY_COUNTS)
+        for order in comment_orders:
             comment = {
                 "comment": order.comment,  # 评论的内容
                 "user_name": order.user.name if order.user.name != order.user.mobile else "匿名用户",  # 发表评论的用户
@@ -200,9 +246,13 @@ class Order(BaseModel, db.Model):
     """订单"""
 
     __tablename__ = "ih_order_info"
+    __table_args__ = (
+        # 房屋搜索和下单时的日期冲突检查：按房屋定位，再按入住/离开时间过滤
+        db.Index("ix_ih_order_info_house_id_dates", "house_id", "begin_date", "end_date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)  # 订单编号
-    user_id = db.Column(db.Integer, db.ForeignKey("ih_user_profile.id"), nullable=False)  # 下订单的用户编号
+    user_id = db.Column(db.Integer, db.ForeignKey("ih_user_profile.id"), nullable=False, index=True)  # 下订单的用户编号
     house_id = db.Column(db.Integer, db.ForeignKey("ih_house_info.id"), nullable=False)  # 预订的房间编号
     begin_date = db.Column(db.DateTime, nullable=False)  # 预订的起始时间
     end_date = db.Column(db.DateTime, nullable=False)  # 预订的结束时间
@@ -222,19 +272,68 @@ class Order(BaseModel, db.Model):
         default="WAIT_ACCEPT", index=True)
     comment = db.Column(db.Text)  # 订单的评论信息或者拒单原因
 
-    def to_dict(self):
-        """将订单信息转换为字典数据"""
-        order_dict = {
-            "order_id": self.id,
-            "title": self.house.title,
-            "img_url": constants.QINIU_DOMIN_PREFIX + self.house.index_image_url if self.house.index_image_url else "",
-            "start_date": self.begin_date.strftime("%Y-%m-%d"),
-            "end_date": self.end_date.strftime("%Y-%m-%d"),
-            "ctime": self.create_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "days": self.days,
-            "amount": self.amount,
-            "status": self.status,
-            "comment": self.comment if self.comment else ""
-        }
+    # 已取消或者被拒单的订单不再占用房屋的入住时间
+    RELEASED_STATUSES = ("CANCELED", "REJECTED")
+
+    # to_dict的字段 -> (需要加载的订单的列, 需要加载的房屋的列)
+    DICT_FIELDS = {
+        "order_id": (("id",), ()),
+        "title": ((), ("title",)),
+        "img_url": ((), ("index_image_url",)),
+        "start_date": (("begin_date",), ()),
+        "end_date": (("end_date",), ()),
+        "ctime": (("create_time",), ()),
+        "days": (("days",), ()),
+        "amount": (("amount",), ()),
+        "status": (("status",), ()),
+        "comment": (("comment",), ())
+    }
+
+    @classmethod
+    def dict_columns(cls, fields=None):
+        """to_dict中的字段需要加载的订单的列和房屋的列，fields为None表示所有字段"""
+        order_columns = set(["id"])
+        house_columns = set(["id"])
+        for name in fields or cls.DICT_FIELDS:
+            order_columns.update(cls.DICT_FIELDS[name][0])
+            house_columns.update(cls.DICT_FIELDS[name][1])
+        return sorted(order_columns), sorted(house_columns)
+
+    def to_dict(self, fields=None):
+        """将订单信息转换为字典数据
+        fields: 需要的字段，为None时返回所有字段；只读取需要的属性，查询时可以只加载对应的列
+        """
+        fields = fields or self.DICT_FIELDS
+        # 不需要房屋的字段时不访问self.house，避免再查询一次房屋
+        house = self.house if "title" in fields or "img_url" in fields else None
+        return Order.fields_dict(self, house, fields)
+
+    @staticmethod
+    def fields_dict(order, house, fields):
+        """订单的字典数据
+        order可以是Order对象，也可以是包含订单表的列的查询结果行；house同样可以是House对象或者包含房屋的列的行
+        """
+        order_dict = {}
+        if "order_id" in fields:
+            order_dict["order_id"] = order.id
+        if "title" in fields:
+            order_dict["title"] = house.title
+        if "img_url" in fields:
+            order_dict["img_url"] = constants.QINIU_DOMIN_PREFIX + house.index_image_url \
+                if house.index_image_url else ""
+        if "start_date" in fields:
+            order_dict["start_date"] = order.begin_date.strftime("%Y-%m-%d")
+        if "end_date" in fields:
+            order_dict["end_date"] = order.end_date.strftime("%Y-%m-%d")
+        if "ctime" in fields:
+            order_dict["ctime"] = order.create_time.strftime("%Y-%m-%d %H:%M:%S")
+        if "days" in fields:
+            order_dict["days"] = order.days
+        if "amount" in fields:
+            order_dict["amount"] = order.amount
+        if "status" in fields:
+            order_dict["status"] = order.status
+        if "comment" in fields:
+            order_dict["comment"] = order.comment if order.comment else ""
         return order_dict
 
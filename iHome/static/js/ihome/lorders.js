@@ -17,93 +17,109 @@ function getCookie(name) {
 $(document).ready(function(){
     $('.modal').on('show.bs.modal', centerModals);      //当模态框出现的时候
     $(window).on('resize', centerModals);
-    // TODO: 查询房东的订单、客户订单
-    $.get('/api/1.0/orders?role=landlord', function (response) {
-        if (response.errno == '0') {
-            // 渲染我的订单界面
-            var html = template('orders-list-tmpl', {'orders':response.data});
-            $('.orders-list').html(html);
-
-            // TODO: 查询成功之后需要设置接单的处理
-            $(".order-accept").on("click", function(){
-                var orderId = $(this).parents("li").attr("order-id");
-                $(".modal-accept").attr("order-id", orderId);
-            });
-
-            // 给确认接单标签添加点击事件，发送接单的请求、
-            $(".modal-accept").on('click', function () {
-                // 获取要接单的订单的id
-                var orderId = $(".modal-accept").attr("order-id");
-               $.ajax({
-                   url: '/api/1.0/orders/' + orderId + '?action=accept',
-                   type: 'put',
-                   headers: {'X-CSRFToken':getCookie('csrf_token')},
-                   success:function (response) {
-                       if (response.errno == '0') {
-                           // 1. 设置订单状态的html
-                            $(".orders-list>li[order-id="+ orderId +"]>div.order-content>div.order-text>ul li:eq(4)>span").html("已接单");
-                            // 2. 隐藏接单和拒单操作
-                            $("ul.orders-list>li[order-id="+ orderId +"]>div.order-title>div.order-operate").hide();
-                            // 3. 隐藏弹出的框
-                            $("#accept-modal").modal("hide");
-                       } else if (response.errno == '4101') {
-                           location.href = '/';
-                       } else {
-                           alert(response,errmsg);
-                       }
-                   }
-               });
-            });
+    // TODO: 查询房东的订单、客户订单：每次查询一页，滚动到页面底部时使用next_cursor查询下一页
+    var next_cursor = "";
+    var orders_querying = false;
+    function loadOrders() {
+        orders_querying = true;
+        $.get('/api/1.0/orders?role=landlord', {cursor:next_cursor}, function (response) {
+            orders_querying = false;
+            if (response.errno == '0') {
+                // 渲染我的订单界面，第一页替换，之后的页追加
+                var html = template('orders-list-tmpl', {'orders':response.data.orders});
+                if (next_cursor) {
+                    $('.orders-list').append(html);
+                } else {
+                    $('.orders-list').html(html);
+                }
+                next_cursor = response.data.next_cursor;
+            } else if (response.errno == '4101') {
+                location.href = '/';
+            } else {
+                alert(response.errmsg);
+            }
+        });
+    }
+    loadOrders();
 
+    $(window).on('scroll', function () {
+        if (next_cursor && !orders_querying && $(window).scrollTop() + $(window).height() > $(document).height() - 50) {
+            loadOrders();
+        }
+    });
 
-            // TODO: 查询成功之后需要设置拒单的处理
-            $(".order-reject").on("click", function(){
-                var orderId = $(this).parents("li").attr("order-id");
-                $(".modal-reject").attr("order-id", orderId);
-            });
+    // TODO: 查询成功之后需要设置接单的处理，后加载的订单也需要处理，所以绑定在订单列表上
+    $(".orders-list").on("click", ".order-accept", function(){
+        var orderId = $(this).parents("li").attr("order-id");
+        $(".modal-accept").attr("order-id", orderId);
+    });
 
-            // 给确认接单标签添加点击事件，发送接单的请求、
-            $(".modal-reject").on('click', function () {
-                // 获取要接单的订单的id
-                var orderId = $(".modal-reject").attr("order-id");
-                // 获取拒单理由
-                var reason = $('#reject-reason').val();
-                if (!reason) {
-                    alert('请输入拒单理由');
-                    return;
-                }
-                var params = {
-                    'reason':reason
-                };
+    // 给确认接单标签添加点击事件，发送接单的请求、
+    $(".modal-accept").on('click', function () {
+        // 获取要接单的订单的id
+        var orderId = $(".modal-accept").attr("order-id");
+       $.ajax({
+           url: '/api/1.0/orders/' + orderId + '?action=accept',
+           type: 'put',
+           headers: {'X-CSRFToken':getCookie('csrf_token')},
+           success:function (response) {
+               if (response.errno == '0') {
+                   // 1. 设置订单状态的html
+                    $(".orders-list>li[order-id="+ orderId +"]>div.order-content>div.order-text>ul li:eq(4)>span").html("已接单");
+                    // 2. 隐藏接单和拒单操作
+                    $("ul.orders-list>li[order-id="+ orderId +"]>div.order-title>div.order-operate").hide();
+                    // 3. 隐藏弹出的框
+                    $("#accept-modal").modal("hide");
+               } else if (response.errno == '4101') {
+                   location.href = '/';
+               } else {
+                   alert(response,errmsg);
+               }
+           }
+       });
+    });
 
-               $.ajax({
-                   url: '/api/1.0/orders/' + orderId + '?action=reject',
-                   data:JSON.stringify(params),
-                   contentType:'application/json',
-                   type: 'put',
-                   headers: {'X-CSRFToken':getCookie('csrf_token')},
-                   success:function (response) {
-                       if (response.errno == '0') {
-                           // 1. 设置订单状态的html
-                            $(".orders-list>li[order-id="+ orderId +"]>div.order-content>div.order-text>ul li:eq(4)>span").html("已拒单");
-                            // 2. 隐藏接单和拒单操作
-                            $("ul.orders-list>li[order-id="+ orderId +"]>div.order-title>div.order-operate").hide();
-                            // 3. 隐藏弹出的框
-                            $("#reject-modal").modal("hide");
-                       } else if (response.errno == '4101') {
-                           location.href = '/';
-                       } else {
-                           alert(response,errmsg);
-                       }
-                   }
-               });
-            });
 
+    // TODO: 查询成功之后需要设置拒单的处理
+    $(".orders-list").on("click", ".order-reject", function(){
+        var orderId = $(this).parents("li").attr("order-id");
+        $(".modal-reject").attr("order-id", orderId);
+    });
 
-        } else if (response.errno == '4101') {
-            location.href = '/';
-        } else {
-            alert(response.errmsg);
+    // 给确认接单标签添加点击事件，发送接单的请求、
+    $(".modal-reject").on('click', function () {
+        // 获取要接单的订单的id
+        var orderId = $(".modal-reject").attr("order-id");
+        // 获取拒单理由
+        var reason = $('#reject-reason').val();
+        if (!reason) {
+            alert('请输入拒单理由');
+            return;
         }
+        var params = {
+            'reason':reason
+        };
+
+       $.ajax({
+           url: '/api/1.0/orders/' + orderId + '?action=reject',
+           data:JSON.stringify(params),
+           contentType:'application/json',
+           type: 'put',
+           headers: {'X-CSRFToken':getCookie('csrf_token')},
+           success:function (response) {
+               if (response.errno == '0') {
+                   // 1. 设置订单状态的html
+                    $(".orders-list>li[order-id="+ orderId +"]>div.order-content>div.order-text>ul li:eq(4)>span").html("已拒单");
+                    // 2. 隐藏接单和拒单操作
+                    $("ul.orders-list>li[order-id="+ orderId +"]>div.order-title>div.order-operate").hide();
+                    // 3. 隐藏弹出的框
+                    $("#reject-modal").modal("hide");
+               } else if (response.errno == '4101') {
+                   location.href = '/';
+               } else {
+                   alert(response,errmsg);
+               }
+           }
+       });
     });
 });
@@ -18,52 +18,69 @@ $(document).ready(function(){
     $('.modal').on('show.bs.modal', centerModals);      //当模态框出现的时候
     $(window).on('resize', centerModals);
 
-    // TODO: 查询我的订单
-    $.get('/api/1.0/orders?role=custom', function (response) {
-        if (response.errno == '0') {
-            // 渲染我的订单界面
-            var html = template('orders-list-tmpl', {'orders':response.data});
-            $('.orders-list').html(html);
-
+    // TODO: 查询我的订单：每次查询一页，滚动到页面底部时使用next_cursor查询下一页
+    var next_cursor = "";
+    var orders_querying = false;
+    function loadOrders() {
+        orders_querying = true;
+        $.get('/api/1.0/orders?role=custom', {cursor:next_cursor}, function (response) {
+            orders_querying = false;
+            if (response.errno == '0') {
+                // 渲染我的订单界面，第一页替换，之后的页追加
+                var html = template('orders-list-tmpl', {'orders':response.data.orders});
+                if (next_cursor) {
+                    $('.orders-list').append(html);
+                } else {
+                    $('.orders-list').html(html);
+                }
+                next_cursor = response.data.next_cursor;
+            } else if (response.errno == '4101') {
+                location.href = '/';
+            } else {
+                alert(response.errmsg);
+            }
+        });
+    }
+    loadOrders();
 
-            // TODO: 查询成功之后需要设置评论的相关处理
-            $(".order-comment").on("click", function(){
-                var orderId = $(this).parents("li").attr("order-id");
-                $(".modal-comment").attr("order-id", orderId);
-            });
+    $(window).on('scroll', function () {
+        if (next_cursor && !orders_querying && $(window).scrollTop() + $(window).height() > $(document).height() - 50) {
+            loadOrders();
+        }
+    });
 
-            // 发送评价数据给后端
-            $(".modal-comment").on('click', function () {
-                var orderId = $(".modal-comment").attr("order-id");
-                var comment = $('#comment').val();
-                if (!comment) {
-                    alert('请输入评论信息');
-                    return;
-                }
-                $.ajax({
-                    url: '/api/1.0/orders/'+ orderId +'/comment',
-                    type: 'post',
-                    data: JSON.stringify({'comment':comment}),
-                    contentType: 'application/json',
-                    headers: {'X-CSRFToken':getCookie('csrf_token')},
-                    success:function (response) {
-                        if (response.errno == '0') {
-                            $(".orders-list>li[order-id="+ orderId +"]>div.order-content>div.order-text>ul li:eq(4)>span").html("已完成");
-                            $("ul.orders-list>li[order-id="+ orderId +"]>div.order-title>div.order-operate").hide();
-                            $("#comment-modal").modal("hide");
-                        } else if (response.errno == '4101') {
-                            location.href = '/';
-                        } else {
-                            alert(response,errmsg);
-                        }
-                    }
-                });
-            });
+    // TODO: 查询成功之后需要设置评论的相关处理，后加载的订单也需要处理，所以绑定在订单列表上
+    $(".orders-list").on("click", ".order-comment", function(){
+        var orderId = $(this).parents("li").attr("order-id");
+        $(".modal-comment").attr("order-id", orderId);
+    });
 
-        } else if (response.errno == '4101') {
-            location.href = '/';
-        } else {
-            alert(response.errmsg);
+    // 发送评价数据给后端
+    $(".modal-comment").on('click', function () {
+        var orderId = $(".modal-comment").attr("order-id");
+        var comment = $('#comment').val();
+        if (!comment) {
+            alert('请输入评论信息');
+            return;
         }
+        $.ajax({
+            url: '/api/1.0/orders/'+ orderId +'/comment',
+            type: 'post',
+            data: JSON.stringify({'comment':comment}),
+            contentType: 'application/json',
+            headers: {'X-CSRFToken':getCookie('csrf_token')},
+            success:function (response) {
+                if (response.errno == '0') {
+                    $(".orders-list>li[order-id="+ orderId +"]>div.order-content>div.order-text>ul li:eq(4)>span").html("已完成");
+                    $("ul.orders-list>li[order-id="+ orderId +"]>div.order-title>div.order-operate").hide();
+                    $("#comment-modal").modal("hide");
+                } else if (response.errno == '4101') {
+                    location.href = '/';
+                } else {
+                    alert(response,errmsg);
+                }
+            }
+        });
     });
 });
+
@@ -1,6 +1,7 @@
 var cur_page = 1; // 当前页
 var next_page = 1; // 下一页
 var total_page = 1;  // 总页数
+var next_cursor = ""; // 下一页的游标
 var house_data_querying = true;   // 是否正在向后台获取数据
 
 // 解析url中的查询字符串
@@ -42,7 +43,8 @@ function updateHouseData(action) {
         sd:startDate,
         ed:endDate,
         sk:sortKey,
-        p:next_page
+        // 使用游标分页，第一页传空的游标
+        cursor:(next_page == 1 ? "" : next_cursor)
     };
 
     // TODO: 获取房屋列表信息
@@ -58,6 +60,8 @@ function updateHouseData(action) {
 
             // 后端需要将总页数返回给前端并保存 total_page
             total_page = response.data.total_page;
+            // 保存下一页的游标
+            next_cursor = response.data.next_cursor;
 
             // 使用art-template模板引擎，生成需要渲染的html内容
             var html = template('house-list-tmpl', {'houses':response.data.houses});
@@ -129,7 +133,7 @@ $(document).ready(function(){
                         // 将正在向后端查询房屋列表信息的标志设置为真
                         house_data_querying = true;
                         // 如果当前页面数还没到达总页数
-                        if(cur_page < total_page) {
+                        if(cur_page < total_page && next_cursor) {
                             // 将要查询的页数设置为当前页数加1
                             next_page = cur_page + 1;
                             // 向后端发送请求，查询下一页房屋数据// 向后端发送请求，查询下一页房屋数据
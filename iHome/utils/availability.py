@@ -0,0 +1,144 @@
+# -*- coding:utf-8 -*-
+# 房屋预订日历索引：每一晚使用一个redis位图记录当晚已被预订的房屋，位的偏移量就是房屋编号
+# 订单占用[入住时间, 离开时间)之间的每一晚，搜索[sd, ed)时只需要读取这几晚的位图合并，
+# 就能得到这段时间内有冲突订单的房屋，不需要扫描订单表
+# 索引需要先使用 python manage.py availability rebuild 根据订单数据生成，生成之前以及redis异常时调用方使用SQL查询
+# 每一晚的位图在这一晚结束NIGHT_KEEP_DAYS天后过期，过去的日期不会一直占用redis
+
+
+import re
+import uuid
+import datetime
+import iHome
+from iHome import db
+from iHome.models import Order
+
+
+NIGHT_KEY = 'availability:night:%s'
+# 索引已经生成的标记
+READY_KEY = 'availability:ready'
+# 合并几晚的位图时使用的临时key
+MERGED_KEY = 'availability:merged:%s'
+# 取值不为0的字节
+NONZERO_BYTE_RE = re.compile(b'[^\x00]')
+# 一晚结束后位图保留的天数
+NIGHT_KEEP_DAYS = 1
+
+
+def night_key(night):
+    return NIGHT_KEY % night.strftime('%Y%m%d')
+
+
+def night_expire_time(night):
+    """这一晚的位图过期的时间：这一晚结束(第二天)之后再保留NIGHT_KEEP_DAYS天"""
+    return night + datetime.timedelta(days=1 + NIGHT_KEEP_DAYS)
+
+
+def iter_nights(start_date, end_date):
+    """[start_date, end_date)之间的每一晚"""
+    night = datetime.datetime(start_date.year, start_date.month, start_date.day)
+    while night < end_date:
+        yield night
+        night += datetime.timedelta(days=1)
+
+
+def is_ready():
+    return bool(iHome.redis_store.exists(READY_KEY))
+
+
+def bitmap_offsets(bitmap):
+    """位图中所有被设置的位的偏移量，只检查取值不为0的字节"""
+    offsets = []
+    for match in NONZERO_BYTE_RE.finditer(bitmap or b''):
+        value = ord(match.group())
+        for bit in range(8):
+            if value & (0x80 >> bit):
+                offsets.append(match.start() * 8 + bit)
+    return offsets
+
+
+def booked_house_ids(start_date, end_date, max_count):
+    """[start_date, end_date)期间有冲突订单的房屋编号
+    几晚的位图在redis中使用BITOP OR合并，BITCOUNT得到房屋数量，不超过max_count时才读取合并后的位图
+    索引还没有生成、开始的这一晚的位图已经过期或者房屋数量超过max_count时返回None，由调用方使用SQL查询
+    """
+    if night_expire_time(datetime.datetime(start_date.year, start_date.month, start_date.day)) \
+            <= datetime.datetime.now():
+        return None
+    merged_key = MERGED_KEY % uuid.uuid4().hex
+    pipeline = iHome.redis_store.pipeline()
+    pipeline.exists(READY_KEY)
+    pipeline.bitop('OR', merged_key, *[night_key(night) for night in iter_nights(start_date, end_date)])
+    pipeline.bitcount(merged_key)
+    pipeline.expire(merged_key, 10)
+    ready, _, count, _ = pipeline.execute()
+    if not ready or count > max_count:
+        iHome.redis_store.delete(merged_key)
+        return None
+
+    pipeline = iHome.redis_store.pipeline()
+    pipeline.get(merged_key)
+    pipeline.delete(merged_key)
+    bitmap, _ = pipeline.execute()
+    return bitmap_offsets(bitmap)
+
+
+def book(house_id, start_date, end_date):
+    """订单创建后，标记房屋在[start_date, end_date)期间已被预订"""
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    for night in iter_nights(start_date, end_date):
+        pipeline.setbit(night_key(night), house_id, 1)
+        pipeline.expireat(night_key(night), night_expire_time(night))
+    pipeline.execute()
+
+
+def release(house_id, start_date, end_date):
+    """订单被拒绝或者取消后，释放房屋在[start_date, end_date)期间的预订
+    同一晚可能还被该房屋的其它订单占用(例如历史数据)，这些晚上需要保留
+    """
+    held_nights = set()
+    active_orders = db.session.query(Order.begin_date, Order.end_date) \
+        .filter(Order.house_id == house_id, Order.status.notin_(Order.RELEASED_STATUSES),
+                Order.begin_date < end_date, Order.end_date > start_date)
+    for begin_date, order_end_date in active_orders:
+        held_nights.update(iter_nights(begin_date, order_end_date))
+
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    for night in iter_nights(start_date, end_date):
+        if night not in held_nights:
+            pipeline.setbit(night_key(night), house_id, 0)
+            pipeline.expireat(night_key(night), night_expire_time(night))
+    pipeline.execute()
+
+
+def rebuild(batch_size=10000):
+    """根据订单数据重新生成整个索引，返回(订单数量, 位图数量)"""
+    bitmaps = {}
+    max_house_id = db.session.query(db.func.max(Order.house_id)).scalar() or 0
+    length = max_house_id // 8 + 1
+
+    order_count = 0
+    orders = db.session.query(Order.house_id, Order.begin_date, Order.end_date) \
+        .filter(Order.status.notin_(Order.RELEASED_STATUSES)).yield_per(batch_size)
+    for house_id, begin_date, end_date in orders:
+        order_count += 1
+        byte_index, bit = divmod(house_id, 8)
+        for night in iter_nights(begin_date, end_date):
+            bitmap = bitmaps.get(night)
+            if bitmap is None:
+                bitmap = bitmaps[night] = bytearray(length)
+            bitmap[byte_index] |= 0x80 >> bit
+
+    # 在一个事务中替换旧的索引，替换过程中的搜索不会读到一半的数据
+    pipeline = iHome.redis_store.pipeline()
+    for key in iHome.redis_store.scan_iter(NIGHT_KEY % '*', count=1000):
+        pipeline.delete(key)
+    now = datetime.datetime.now()
+    for night, bitmap in bitmaps.items():
+        # 已经过期的晚上不再写入
+        if night_expire_time(night) > now:
+            pipeline.set(night_key(night), bytes(bitmap))
+            pipeline.expireat(night_key(night), night_expire_time(night))
+    pipeline.set(READY_KEY, 1)
+    pipeline.execute()
+    return order_count, len(bitmaps)
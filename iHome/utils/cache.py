@@ -0,0 +1,172 @@
+# -*- coding:utf-8 -*-
+# 读接口的缓存装饰器：防止缓存失效时大量请求同时查询数据库，数据库异常时使用旧数据
+
+
+import time
+import uuid
+from functools import wraps
+from flask import current_app
+import iHome
+from iHome import constants
+from iHome.utils import cache_codec
+
+
+LOCK_KEY = 'lock:%s'
+
+
+def read_cache(key, raw=False):
+    """读取缓存，返回(有效期截止时间, 数据)，没有缓存时返回None
+    缓存的内容 = 有效期截止时间 + ':' + 数据，raw为True时数据是已经序列化好的bytes，不需要解码
+    """
+    return parse_cache(iHome.redis_store.get(key), raw)
+
+
+def parse_cache(content, raw=False):
+    """解析缓存的内容，返回(有效期截止时间, 数据)，content为空时返回None"""
+    if not content:
+        return None
+    fresh_until, _, data = content.partition(b':')
+    return int(fresh_until), data if raw else cache_codec.loads(data)
+
+
+def read_caches(keys, raw=False):
+    """使用一次MGET批量读取缓存，返回和keys顺序一致的列表，没有缓存或者缓存无法解析的位置为None"""
+    entries = []
+    for content in iHome.redis_store.mget(keys):
+        try:
+            entries.append(parse_cache(content, raw))
+        except ValueError as e:
+            current_app.logger.error(e)
+            entries.append(None)
+    return entries
+
+
+def cache_content(data, expires, raw=False):
+    return b'%d:' % (time.time() + expires) + (data if raw else cache_codec.dumps(data))
+
+
+def write_cache(key, data, expires, stale_expires, raw=False):
+    """写入缓存：expires秒内有效，之后再保留stale_expires秒作为旧数据使用"""
+    iHome.redis_store.set(key, cache_content(data, expires, raw), expires + stale_expires)
+
+
+def write_caches(items, expires, stale_expires, raw=False):
+    """使用pipeline批量写入缓存，items是[(key, 数据)]"""
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    for key, data in items:
+        pipeline.set(key, cache_content(data, expires, raw), expires + stale_expires)
+    pipeline.execute()
+
+
+def acquire_lock(key):
+    """获取重新查询数据的锁，同一时间只有一个请求可以获取到，返回锁的标识，没有获取到返回None"""
+    token = uuid.uuid4().hex
+    if iHome.redis_store.set(LOCK_KEY % key, token, ex=constants.CACHE_LOCK_EXPIRES, nx=True):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    """释放锁，锁已经超时被其它请求获取时不删除"""
+    lock_key = LOCK_KEY % key
+    try:
+        if iHome.redis_store.get(lock_key) == token.encode('ascii'):
+            iHome.redis_store.delete(lock_key)
+    except Exception as e:
+        current_app.logger.error(e)
+
+
+def wait_cache(key, raw=False):
+    """等待获取到锁的请求写入缓存，超时返回None"""
+    for _ in range(constants.CACHE_LOCK_WAIT_TIMES):
+        time.sleep(constants.CACHE_LOCK_WAIT_INTERVAL)
+        entry = read_cache(key, raw)
+        if entry:
+            return entry
+    return None
+
+
+def cached(make_key, expires, stale_expires=constants.CACHE_STALE_REDIS_EXPIRES, raw=False):
+    """缓存被装饰函数的返回值
+    make_key: 使用被装饰函数的参数生成缓存key，返回None表示不使用缓存
+    expires: 缓存的有效时间，单位：秒
+    stale_expires: 缓存过期后，还可以作为旧数据使用的时间，单位：秒
+    raw: 被装饰函数返回的是已经序列化好的bytes，原样缓存，读取时也不需要解码
+
+    1.缓存有效，直接返回
+    2.缓存过期：获取到锁的请求重新查询并更新缓存，其它请求直接返回旧数据
+    3.没有缓存：获取到锁的请求查询并写入缓存，其它请求等待缓存写入，等待超时后自己查询
+    4.查询出现异常时，有旧数据就返回旧数据，没有旧数据再抛出异常
+    返回值为None时不缓存
+
+    数据变化时可以调用被装饰函数的refresh方法，立即重新查询并更新缓存
+    """
+
+    def decorator(func):
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = make_key(*args, **kwargs)
+            except Exception as e:
+                current_app.logger.error(e)
+                key = None
+            if key is None:
+                return func(*args, **kwargs)
+
+            # 1.缓存有效，直接返回
+            entry = None
+            try:
+                entry = read_cache(key, raw)
+            except Exception as e:
+                current_app.logger.error(e)
+            if entry and entry[0] > time.time():
+                return entry[1]
+
+            token = None
+            try:
+                token = acquire_lock(key)
+                if not token:
+                    # 2.其它请求正在重新查询，有旧数据就返回旧数据，没有就等待
+                    if entry:
+                        return entry[1]
+                    entry = wait_cache(key, raw)
+                    if entry:
+                        return entry[1]
+            except Exception as e:
+                current_app.logger.error(e)
+
+            # 3.查询数据
+            try:
+                data = func(*args, **kwargs)
+            except Exception as e:
+                if token:
+                    release_lock(key, token)
+                # 4.查询出现异常时，使用旧数据
+                if entry:
+                    current_app.logger.error(e)
+                    return entry[1]
+                raise
+
+            # 先写入缓存再释放锁，等待的请求可以直接读取到新的缓存
+            if data is not None:
+                try:
+                    write_cache(key, data, expires, stale_expires, raw)
+                except Exception as e:
+                    current_app.logger.error(e)
+            if token:
+                release_lock(key, token)
+            return data
+
+        def refresh(*args, **kwargs):
+            """重新查询数据并更新缓存"""
+            data = func(*args, **kwargs)
+            key = make_key(*args, **kwargs)
+            if key is not None and data is not None:
+                write_cache(key, data, expires, stale_expires, raw)
+            return data
+
+        wrapper.refresh = refresh
+        return wrapper
+
+    return decorator
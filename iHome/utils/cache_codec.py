@@ -0,0 +1,44 @@
+# -*- coding:utf-8 -*-
+# 缓存数据的编解码
+# 缓存的内容 = 版本号(1字节) + 数据格式(1字节) + 数据
+# 数据使用紧凑的JSON编码，超过COMPRESS_THRESHOLD字节时使用zlib压缩
+# 读取时版本号或者格式不认识(例如以前使用str()写入的缓存)就抛出ValueError，调用方当作没有缓存处理
+
+
+import json
+import zlib
+
+
+# 当前的编码版本，编码方式改变时需要增加版本号，旧版本的缓存会被当作没有缓存
+CODEC_VERSION = b'\x01'
+# 数据格式
+FORMAT_JSON = b'j'
+FORMAT_JSON_ZLIB = b'z'
+# 超过该字节数的数据需要压缩
+COMPRESS_THRESHOLD = 1024
+HEADER_LENGTH = 2
+
+
+def dumps(data, compress_threshold=COMPRESS_THRESHOLD):
+    """将数据编码为缓存内容"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    if not isinstance(payload, bytes):
+        payload = payload.encode('utf-8')
+
+    if len(payload) > compress_threshold:
+        return CODEC_VERSION + FORMAT_JSON_ZLIB + zlib.compress(payload)
+    return CODEC_VERSION + FORMAT_JSON + payload
+
+
+def loads(content):
+    """将缓存内容解码为数据"""
+    if not content or len(content) < HEADER_LENGTH or content[:1] != CODEC_VERSION:
+        raise ValueError('unsupported cache content')
+
+    data_format = content[1:HEADER_LENGTH]
+    payload = content[HEADER_LENGTH:]
+    if data_format == FORMAT_JSON_ZLIB:
+        payload = zlib.decompress(payload)
+    elif data_format != FORMAT_JSON:
+        raise ValueError('unsupported cache format: %r' % data_format)
+    return json.loads(payload.decode('utf-8'))
@@ -0,0 +1,57 @@
+# -*- coding:utf-8 -*-
+# 缓存的版本号：缓存key中带上所属范围(例如城区)的版本号，数据变化时只需要INCR版本号，
+# 旧版本的缓存不会再被读取，等待过期自动删除，不需要使用KEYS/SCAN查找并删除旧的缓存
+# 版本号同时记录增加的时间，作为接口响应的Last-Modified
+
+
+import time
+import datetime
+import iHome
+
+
+GENERATION_KEY = 'generation:%s:%s'
+GENERATION_TIME_KEY = 'generation_time:%s:%s'
+
+# 房屋列表缓存的版本号按城区划分，不限城区的搜索使用单独的版本号
+HOUSE_LIST = 'house_list'
+ALL_AREAS = 'all'
+
+
+def get_generation(namespace, scope):
+    """获取scope范围内缓存的版本号，没有记录时为0"""
+    generation = iHome.redis_store.get(GENERATION_KEY % (namespace, scope))
+    return int(generation) if generation else 0
+
+
+def get_generation_time(namespace, scope):
+    """获取scope范围内缓存的版本号和版本号最后增加的时间(UTC)，没有记录时为(0, None)"""
+    generation, modified = iHome.redis_store.mget(GENERATION_KEY % (namespace, scope),
+                                                  GENERATION_TIME_KEY % (namespace, scope))
+    if modified:
+        modified = datetime.datetime.utcfromtimestamp(int(modified))
+    return int(generation) if generation else 0, modified
+
+
+def bump_generation(namespace, *scopes):
+    """增加各个scope范围内缓存的版本号，使这些范围内的旧缓存失效"""
+    now = int(time.time())
+    pipeline = iHome.redis_store.pipeline()
+    for scope in scopes:
+        pipeline.incr(GENERATION_KEY % (namespace, scope))
+        pipeline.set(GENERATION_TIME_KEY % (namespace, scope), now)
+    pipeline.execute()
+
+
+def house_list_generation(area_id):
+    """获取房屋列表缓存的版本号，area_id为空表示不限城区"""
+    return get_generation(HOUSE_LIST, area_id or ALL_AREAS)
+
+
+def house_list_generation_time(area_id):
+    """获取房屋列表缓存的版本号和最后变化的时间，area_id为空表示不限城区"""
+    return get_generation_time(HOUSE_LIST, area_id or ALL_AREAS)
+
+
+def invalidate_house_list(area_id):
+    """城区内的房屋或者订单变化后，使该城区和不限城区的房屋列表缓存失效，其它城区的缓存不受影响"""
+    bump_generation(HOUSE_LIST, area_id, ALL_AREAS)
@@ -1,8 +1,10 @@
 # -*- coding:utf-8 -*-
 from werkzeug.routing import BaseConverter
-from flask import session, jsonify, g
+from flask import session, jsonify, g, current_app, request
 from iHome.utils.response_code import RET
 from functools import wraps
+import json
+import hashlib
 
 
 
@@ -35,4 +37,82 @@ def login_required(view_func):
 
             return view_func(*args, **kwargs)
 
-    return wraaper
\ No newline at end of file
+    return wraaper
+
+
+def json_bytes(data):
+    """将数据序列化为紧凑的JSON bytes，可以直接缓存，再作为响应体的一部分发送"""
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def raw_jsonify(data_json, errno=RET.OK, errmsg='OK'):
+    """使用已经序列化好的data构造响应，与jsonify(errno=errno, errmsg=errmsg, data=data)的内容相同
+    data不需要再解析和序列化，直接拼接到响应体中
+    """
+    body = b''.join([b'{"errno":', json_bytes(errno), b',"errmsg":', json_bytes(errmsg), b',"data":', data_json, b'}'])
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def parse_fields(value, allowed):
+    """解析fields参数(以逗号分隔的字段名)，返回需要的字段列表，不传时返回None表示所有字段
+    allowed: 接口支持的字段，有不支持的字段时抛出ValueError
+    """
+    if not value:
+        return None
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name not in allowed:
+            raise ValueError('不支持的字段: %s' % name)
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def pick_fields(data, fields):
+    """只保留字典中需要的字段，fields为None时原样返回"""
+    if fields is None:
+        return data
+    return dict((name, data[name]) for name in fields if name in data)
+
+
+def make_etag(*parts):
+    """由缓存的版本号、请求参数等生成ETag，parts相同时ETag相同"""
+    return hashlib.md5(json.dumps(parts, sort_keys=True)).hexdigest()
+
+
+def conditional_response(response, cache_control, etag=None, last_modified=None):
+    """给成功的响应加上Cache-Control、ETag和Last-Modified，请求中的If-None-Match(没有时使用If-Modified-Since)
+    表示客户端的缓存仍然有效时，转换为不带响应体的304响应
+    etag: 不传时使用响应体的摘要
+    """
+    response.headers['Cache-Control'] = cache_control
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    if last_modified:
+        response.last_modified = last_modified
+    return response.make_conditional(request)
+
+
+def skip_public_session(session_interface):
+    """flask_session在session不为空时每个请求都会保存session并输出Set-Cookie，
+    带Set-Cookie的响应被nginx/CDN缓存后，会把一个用户的session cookie发给其它用户
+    Cache-Control为public的响应不依赖登录状态，也不修改session，这些响应不保存session、不输出Set-Cookie
+    """
+    save_session = session_interface.save_session
+
+    def save_private_session(app, session, response):
+        if response.cache_control.public:
+            return
+        return save_session(app, session, response)
+
+    session_interface.save_session = save_private_session
+    return session_interface
+
+
+def not_modified(cache_control, etag, last_modified=None):
+    """在查询数据之前判断客户端的缓存是否仍然有效，有效时返回304响应，否则返回None由视图继续查询"""
+    response = conditional_response(current_app.response_class(), cache_control, etag, last_modified)
+    return response if response.status_code == 304 else None
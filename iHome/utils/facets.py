@@ -0,0 +1,116 @@
+# -*- coding:utf-8 -*-
+# 房屋搜索的筛选条件和分面统计
+# 房屋的设施保存在ih_house_facility中，直接按设施筛选需要关联设施表，要求同时有多个设施时还要分组计数
+# 房屋表中冗余保存设施位图facility_mask，第n位为1表示房屋有编号为n的设施，
+# 要求同时有多个设施只需要一个条件 facility_mask & mask = mask，和城区、价格等条件一起在房屋表上判断
+# 各城区的分面统计(各价格区间、各设施的房屋数量)使用一条GROUP BY查询，结果由调用方缓存
+
+
+from iHome import db, constants
+from iHome.models import House
+
+
+# facility_mask是有符号的64位整数，最高位不使用，设施编号只能是1~62
+# 设施表中出现超出范围的编号时，迁移、backfill_facility_mask和reload_catalogs命令以及加载设施编号时都会报错，
+# 需要先把facility_mask扩展为更宽的位图
+MAX_FACILITY_ID = 62
+
+
+def check_facility_ids(facility_ids):
+    """检查设施表中的编号都能保存到设施位图中，有超出范围的编号时抛出异常"""
+    invalid_ids = sorted(facility_id for facility_id in facility_ids if not 0 < facility_id <= MAX_FACILITY_ID)
+    if invalid_ids:
+        raise ValueError('设施编号%s超出设施位图的范围1~%d，需要扩展facility_mask' % (invalid_ids, MAX_FACILITY_ID))
+
+
+def facility_mask(facility_ids):
+    """设施编号列表转换为设施位图"""
+    mask = 0
+    for facility_id in facility_ids:
+        if not 0 < facility_id <= MAX_FACILITY_ID:
+            raise ValueError('设施编号超出位图范围: %s' % facility_id)
+        mask |= 1 << facility_id
+    return mask
+
+
+def parse_filters(args, facility_ids=None):
+    """从请求参数中解析筛选条件，只返回传入了的条件，参数不合法时抛出异常
+    minp/maxp: 价格区间，单位：元
+    rooms: 最少房间数
+    capacity: 最少入住人数
+    fac: 必须有的设施编号，以逗号分隔，facility_ids是所有设施的编号，传入了fac时必须提供
+    """
+    filters = {}
+    if args.get('minp'):
+        filters['min_price'] = int(float(args['minp']) * 100)
+    if args.get('maxp'):
+        filters['max_price'] = int(float(args['maxp']) * 100)
+    if args.get('rooms'):
+        filters['min_rooms'] = int(args['rooms'])
+    if args.get('capacity'):
+        filters['min_capacity'] = int(args['capacity'])
+    if args.get('fac'):
+        required_ids = [int(facility_id) for facility_id in args['fac'].split(',')]
+        for facility_id in required_ids:
+            if facility_id not in facility_ids:
+                raise ValueError('设施不存在: %s' % facility_id)
+        filters['facility_mask'] = facility_mask(required_ids)
+
+    if filters.get('min_price', 0) > filters.get('max_price', float('inf')):
+        raise ValueError('价格区间有误')
+    return filters
+
+
+def filters_key(filters):
+    """筛选条件在缓存key中的部分，没有筛选条件时为空字符串"""
+    return ','.join('%s:%s' % (name, filters[name]) for name in sorted(filters))
+
+
+def apply_filters(house_query, filters):
+    """给房屋查询加上筛选条件"""
+    if 'min_price' in filters:
+        house_query = house_query.filter(House.price >= filters['min_price'])
+    if 'max_price' in filters:
+        house_query = house_query.filter(House.price <= filters['max_price'])
+    if 'min_rooms' in filters:
+        house_query = house_query.filter(House.room_count >= filters['min_rooms'])
+    if 'min_capacity' in filters:
+        house_query = house_query.filter(House.capacity >= filters['min_capacity'])
+    if 'facility_mask' in filters:
+        mask = filters['facility_mask']
+        house_query = house_query.filter(House.facility_mask.op('&')(mask) == mask)
+    return house_query
+
+
+def facet_counts(area_id, facility_ids):
+    """统计城区内(area_id为空表示不限城区)各价格区间和各设施的房屋数量
+    按价格区间分组，每组同时统计各设施的房屋数，一条SQL完成；区间和设施位使用字面量，分组表达式和查询列完全相同
+    返回 {'price': [{'min': 下限, 'max': 上限, 'count': 数量}], 'facilities': [{'id': 设施编号, 'count': 数量}]}
+    """
+    bounds = constants.HOUSE_PRICE_FACET_BOUNDS
+    bucket = db.case([(House.price < db.literal_column(str(bound * 100)), db.literal_column(str(i)))
+                      for i, bound in enumerate(bounds)], else_=db.literal_column(str(len(bounds))))
+    facility_columns = [
+        db.func.sum(db.case([(House.facility_mask.op('&')(db.literal_column(str(1 << facility_id))) != 0, 1)],
+                            else_=0))
+        for facility_id in facility_ids
+    ]
+
+    query = db.session.query(bucket, db.func.count(House.id), *facility_columns)
+    if area_id:
+        query = query.filter(House.area_id == area_id)
+
+    price_counts = {}
+    facility_counts = [0] * len(facility_ids)
+    for row in query.group_by(bucket).all():
+        price_counts[row[0]] = row[1]
+        for i, count in enumerate(row[2:]):
+            facility_counts[i] += int(count or 0)
+
+    price = []
+    lower = 0
+    for i, upper in enumerate(bounds + [None]):
+        price.append({'min': lower, 'max': upper, 'count': price_counts.get(i, 0)})
+        lower = upper
+    facilities = [{'id': facility_id, 'count': count} for facility_id, count in zip(facility_ids, facility_counts)]
+    return {'price': price, 'facilities': facilities}
@@ -0,0 +1,61 @@
+# -*- coding:utf-8 -*-
+# 房屋卡片缓存：搜索列表、首页和我的房源中展示的房屋基本信息(House.to_basic_dict)
+# 每个房屋一个缓存 house_card:<id>，内容是序列化好的JSON，列表接口先得到房屋编号，
+# 再使用一次MGET读取所有卡片直接拼接到响应中，没有缓存的卡片使用一条SQL批量查询，redis异常时全部从数据库查询
+# 房屋、默认图片、房屋的订单数或者房东的头像变化后删除卡片，下次读取时重新生成
+# 卡片总是缓存所有字段，只需要部分字段(fields参数)时从缓存的卡片中挑选，不同的字段组合共用同一份缓存
+
+
+import json
+from flask import current_app
+import iHome
+from iHome import constants
+from iHome.utils import read_queries
+from iHome.utils.common import json_bytes, pick_fields
+
+
+def card_key(house_id):
+    return constants.HOUSE_CARD_CACHE_KEY % house_id
+
+
+def get_cards(house_ids):
+    """按传入的顺序获取房屋卡片，返回序列化好的JSON列表，不存在的房屋不返回"""
+    if not house_ids:
+        return []
+    try:
+        cards = iHome.redis_store.mget([card_key(house_id) for house_id in house_ids])
+    except Exception as e:
+        current_app.logger.error(e)
+        cards = [None] * len(house_ids)
+
+    missing_ids = [house_id for house_id, card in zip(house_ids, cards) if card is None]
+    if missing_ids:
+        # 卡片只用来序列化，使用Core查询结果行生成，不创建House对象；只查询卡片中使用的列
+        loaded = {}
+        pipeline = iHome.redis_store.pipeline(transaction=False)
+        for house_id, house_dict in read_queries.house_cards(missing_ids).items():
+            loaded[house_id] = json_bytes(house_dict)
+            pipeline.set(card_key(house_id), loaded[house_id], constants.HOUSE_CARD_REDIS_EXPIRES)
+        try:
+            pipeline.execute()
+        except Exception as e:
+            current_app.logger.error(e)
+        cards = [card if card is not None else loaded.get(house_id) for house_id, card in zip(house_ids, cards)]
+
+    return [card for card in cards if card is not None]
+
+
+def cards_json(house_ids, fields=None):
+    """房屋卡片组成的JSON数组
+    fields: 需要的字段，为None时直接拼接缓存的卡片，否则解码每张卡片，只保留需要的字段后重新序列化
+    """
+    cards = get_cards(house_ids)
+    if fields is not None:
+        cards = [json_bytes(pick_fields(json.loads(card), fields)) for card in cards]
+    return b'[' + b','.join(cards) + b']'
+
+
+def delete_cards(*house_ids):
+    """删除房屋卡片，下次读取时重新生成"""
+    if house_ids:
+        iHome.redis_store.delete(*[card_key(house_id) for house_id in house_ids])
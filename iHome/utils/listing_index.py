@@ -0,0 +1,187 @@
+# -*- coding:utf-8 -*-
+# 房屋列表索引：每个城区(以及不限城区)的每种排序字段使用一个redis有序集合，成员是房屋编号，分数是排序值
+# 不按日期筛选的搜索直接使用ZRANGE/ZREVRANGE获取一页房屋编号，ZCARD获取总数，不需要数据库排序和OFFSET
+# 价格从低到高和从高到低使用同一个有序集合，分别正序和倒序读取
+# 成员使用补0的房屋编号，分数相同时按成员的字典序排列，和数据库中按房屋编号排序的结果一致
+# 按日期搜索时，读取一页时跳过这段时间已被预订的房屋(数量有上限)，由它们在有序集合中的名次换算出这一页的位置
+# 索引需要先使用 python manage.py house rebuild_listing 生成，生成之前调用方使用SQL查询
+
+
+import time
+import datetime
+import iHome
+from iHome import db
+from iHome.models import House
+
+
+LISTING_KEY = 'listing:%s:%s'
+# 索引已经生成的标记
+READY_KEY = 'listing:ready'
+ALL_AREAS = 'all'
+
+# 排序方式 -> (排序字段, 是否倒序)
+SORT_FIELDS = {
+    'new': ('new', True),
+    'booking': ('booking', True),
+    'price-inc': ('price', False),
+    'price-des': ('price', True)
+}
+
+
+def listing_key(area_id, field):
+    return LISTING_KEY % (area_id or ALL_AREAS, field)
+
+
+def member(house_id):
+    return '%010d' % house_id
+
+
+def score(field, value):
+    """排序值转换为分数：发布时间使用微秒时间戳，不超过2^53，可以被分数精确保存"""
+    if field == 'new':
+        return int(time.mktime(value.timetuple())) * 1000000 + value.microsecond
+    return value
+
+
+def score_value(field, value):
+    """分数转换为排序值，用于生成游标"""
+    value = int(value)
+    if field == 'new':
+        seconds, microseconds = divmod(value, 1000000)
+        return datetime.datetime.fromtimestamp(seconds) + datetime.timedelta(microseconds=microseconds)
+    return value
+
+
+def house_scores(house):
+    """房屋在各个排序字段中的分数"""
+    return {
+        'new': score('new', house.create_time),
+        'booking': house.order_count or 0,
+        'price': house.price
+    }
+
+
+def add_house(house):
+    """发布房屋后，把房屋加入所在城区和不限城区的各个有序集合"""
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    for field, value in house_scores(house).items():
+        for area_id in (house.area_id, None):
+            pipeline.zadd(listing_key(area_id, field), value, member(house.id))
+    pipeline.execute()
+
+
+def update_order_count(house_id, area_id, order_count):
+    """房屋的订单数变化后，更新订单量排序的分数"""
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    for key_area_id in (area_id, None):
+        pipeline.zadd(listing_key(key_area_id, 'booking'), order_count, member(house_id))
+    pipeline.execute()
+
+
+def house_page(area_id, sk, p=1, cursor_values=None, capacity=1, excluded_ids=None):
+    """获取一页房屋编号，多获取一个用来判断是否还有下一页
+    返回([(房屋编号, 排序值)], 房屋总数)，索引还没有生成或者游标中的房屋已经不在原来的位置时返回None
+    excluded_ids: 不返回的房屋编号(例如这段时间已被预订的房屋)，也不计入总数
+    """
+    field, _ = SORT_FIELDS[sk]
+    return key_page(listing_key(area_id, field), sk, p, cursor_values, capacity, excluded_ids)
+
+
+def key_page(key, sk, p=1, cursor_values=None, capacity=1, excluded_ids=None):
+    """从成员和分数与列表索引相同的有序集合(列表索引本身，或者与它求交集得到的结果)中获取一页房屋编号"""
+    field, descending = SORT_FIELDS[sk]
+    rank_command = 'zrevrank' if descending else 'zrank'
+    excluded_ids = excluded_ids or []
+
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    pipeline.exists(READY_KEY)
+    pipeline.zcard(key)
+    if cursor_values:
+        last_value, last_id = cursor_values
+        getattr(pipeline, rank_command)(key, member(last_id))
+        pipeline.zscore(key, member(last_id))
+    # 排除的房屋在有序集合中的名次，不在集合中的房屋名次为None
+    for house_id in excluded_ids:
+        getattr(pipeline, rank_command)(key, member(house_id))
+    result = pipeline.execute()
+    if not result[0]:
+        return None
+    excluded_ranks = sorted(rank for rank in result[len(result) - len(excluded_ids):] if rank is not None)
+    total_count = result[1] - len(excluded_ranks)
+
+    if cursor_values:
+        # 游标分页：从上一页最后一个房屋的下一个位置开始，房屋的排序值已经变化时无法定位
+        rank, last_score = result[2], result[3]
+        if rank is None or last_score != score(field, last_value):
+            return None
+        start = rank + 1
+    else:
+        # 页码分页：这一页第一个房屋前面有(p - 1) * capacity个没有被排除的房屋，
+        # 名次不超过它的每个被排除的房屋都使它的名次后移一位
+        start = (p - 1) * capacity
+        for excluded_rank in excluded_ranks:
+            if excluded_rank > start:
+                break
+            start += 1
+
+    # 多读取可能落在这一页中的被排除的房屋，去掉它们之后保留capacity + 1个
+    end = start + capacity + sum(1 for excluded_rank in excluded_ranks if excluded_rank >= start)
+    if descending:
+        members = iHome.redis_store.zrevrange(key, start, end, withscores=True)
+    else:
+        members = iHome.redis_store.zrange(key, start, end, withscores=True)
+    excluded = set(excluded_ids)
+    rows = [(int(house_id), score_value(field, value)) for house_id, value in members]
+    return [row for row in rows if row[0] not in excluded][:capacity + 1], total_count
+
+
+def expected_listing(batch_size=10000):
+    """根据房屋表计算所有有序集合应该保存的内容：key -> {成员: 分数}"""
+    listing = {}
+    houses = db.session.query(House.id, House.area_id, House.create_time, House.order_count, House.price) \
+        .yield_per(batch_size)
+    for house in houses:
+        for field, value in house_scores(house).items():
+            for area_id in (house.area_id, None):
+                listing.setdefault(listing_key(area_id, field), {})[member(house.id)] = value
+    return listing
+
+
+def rebuild(batch_size=1000):
+    """根据房屋表重新生成整个索引，返回房屋数量"""
+    listing = expected_listing()
+
+    # 在一个事务中替换旧的索引，替换过程中的搜索不会读到一半的数据
+    pipeline = iHome.redis_store.pipeline()
+    for key in iHome.redis_store.scan_iter(LISTING_KEY % ('*', '*'), count=1000):
+        pipeline.delete(key)
+    for key, scores in listing.items():
+        items = list(scores.items())
+        for i in range(0, len(items), batch_size):
+            args = []
+            for house_member, value in items[i:i + batch_size]:
+                args.extend([value, house_member])
+            pipeline.zadd(key, *args)
+    pipeline.set(READY_KEY, 1)
+    pipeline.execute()
+    return len(listing.get(listing_key(None, 'new'), {}))
+
+
+def check():
+    """检查索引和房屋表是否一致，返回不一致的内容：[(key, 成员, 索引中的分数, 房屋表中的分数)]"""
+    problems = []
+    listing = expected_listing()
+    keys = set(listing)
+    for key in iHome.redis_store.scan_iter(LISTING_KEY % ('*', '*'), count=1000):
+        keys.add(key if isinstance(key, str) else key.decode('utf-8'))
+    for key in sorted(keys):
+        expected = listing.get(key, {})
+        actual = {}
+        for house_member, value in iHome.redis_store.zrange(key, 0, -1, withscores=True):
+            if not isinstance(house_member, str):
+                house_member = house_member.decode('utf-8')
+            actual[house_member] = value
+        for house_member in sorted(set(expected) | set(actual)):
+            if expected.get(house_member) != actual.get(house_member):
+                problems.append((key, house_member, actual.get(house_member), expected.get(house_member)))
+    return problems
@@ -0,0 +1,138 @@
+# -*- coding:utf-8 -*-
+# 进程内缓存：城区、设施这类很少变化的数据直接保存在每个进程的内存中，读取时不需要访问redis
+# 数据变化时通过redis的发布/订阅通知所有进程(例如gunicorn的每个worker)删除自己的缓存，
+# 同时设置有效期，即使错过了通知，过期后也会重新加载
+# 每个进程定期在日志中输出自己的命中统计
+
+
+import os
+import json
+import time
+import logging
+import threading
+from functools import wraps
+import iHome
+from iHome import constants
+
+
+# 通知删除进程内缓存的频道，消息内容为缓存的名字
+INVALIDATE_CHANNEL = 'local_cache_invalidate'
+
+# 所有的进程内缓存：名字 -> LocalCache
+local_caches = {}
+
+# 订阅线程所属的进程，fork出来的子进程需要重新启动订阅线程
+_subscriber_pid = None
+_subscriber_lock = threading.Lock()
+
+# 当前进程下一次输出命中统计的时间
+_next_report_time = None
+
+
+class LocalCache(object):
+    """进程内缓存，记录命中和未命中的次数"""
+
+    def __init__(self, name, expires):
+        self.name = name
+        self.expires = expires
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        local_caches[name] = self
+
+    def get(self, key, load):
+        """读取缓存，没有缓存或者已过期时调用load加载并缓存"""
+        start_subscriber()
+        report_stats()
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.time():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        data = load()
+        self.entries[key] = (time.time() + self.expires, data)
+        return data
+
+    def clear(self):
+        """删除当前进程中的缓存"""
+        self.entries = {}
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+def local_cached(name, expires):
+    """使用进程内缓存保存被装饰函数的返回值，被装饰函数的参数作为缓存的key"""
+
+    def decorator(func):
+        cache = LocalCache(name, expires)
+
+        @wraps(func)
+        def wrapper(*args):
+            return cache.get(args, lambda: func(*args))
+
+        wrapper.local_cache = cache
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    """所有进程内缓存的命中统计"""
+    return dict((name, cache.stats()) for name, cache in local_caches.items())
+
+
+def report_stats():
+    """每隔LOCAL_CACHE_STATS_INTERVAL秒在日志中输出一次当前进程的命中统计，由读取缓存的请求触发"""
+    global _next_report_time
+    now = time.time()
+    if _next_report_time is None:
+        _next_report_time = now + constants.LOCAL_CACHE_STATS_INTERVAL
+        return
+    if now < _next_report_time:
+        return
+    _next_report_time = now + constants.LOCAL_CACHE_STATS_INTERVAL
+    logging.info('local cache stats pid=%d %s', os.getpid(), json.dumps(stats(), sort_keys=True))
+
+
+def publish_invalidate(*names):
+    """通知所有进程删除这些进程内缓存"""
+    for name in names:
+        iHome.redis_store.publish(INVALIDATE_CHANNEL, name)
+
+
+def start_subscriber():
+    """在当前进程中启动订阅线程，每个进程只启动一次"""
+    global _subscriber_pid
+    if _subscriber_pid == os.getpid():
+        return
+    with _subscriber_lock:
+        if _subscriber_pid == os.getpid():
+            return
+        _subscriber_pid = os.getpid()
+        thread = threading.Thread(target=_listen_invalidate, args=(iHome.redis_store,))
+        thread.daemon = True
+        thread.start()
+
+
+def _listen_invalidate(redis_store):
+    """接收删除缓存的通知，连接断开后重新订阅"""
+    while True:
+        try:
+            pubsub = redis_store.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATE_CHANNEL)
+            # 订阅之前可能错过了通知，删除所有的进程内缓存
+            for cache in local_caches.values():
+                cache.clear()
+
+            for message in pubsub.listen():
+                name = message['data']
+                if not isinstance(name, str):
+                    name = name.decode('utf-8')
+                cache = local_caches.get(name)
+                if cache:
+                    cache.clear()
+        except Exception as e:
+            logging.error(e)
+            time.sleep(1)
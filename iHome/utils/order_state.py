@@ -0,0 +1,54 @@
+# -*- coding:utf-8 -*-
+# 订单的状态流转：每次状态变化都是一条带条件的UPDATE语句
+# UPDATE ih_order_info SET status=? ... WHERE id=? AND status=? AND <操作人是房客或者房东>
+# 房客和房东同时操作同一订单时，只有一个UPDATE能修改成功，不会出现先查询再修改导致的覆盖
+# 订单完成时在同一个事务中给房屋的订单数加1，房屋列表按订单量排序时使用
+
+
+from sqlalchemy import and_, exists
+from iHome import db
+from iHome.models import House, Order
+
+
+# 执行操作的角色
+GUEST = 'guest'
+LANDLORD = 'landlord'
+
+# 操作 -> (操作前的状态, 操作后的状态, 可以执行操作的角色)
+TRANSITIONS = {
+    'accept': ('WAIT_ACCEPT', 'WAIT_COMMENT', LANDLORD),  # 房东接单
+    'reject': ('WAIT_ACCEPT', 'REJECTED', LANDLORD),  # 房东拒单
+    'cancel': ('WAIT_ACCEPT', 'CANCELED', GUEST),  # 房客取消订单
+    'pay': ('WAIT_PAYMENT', 'PAID', GUEST),  # 房客支付
+    'comment': ('WAIT_COMMENT', 'COMPLETE', GUEST),  # 房客评价
+}
+
+
+def owner_filter(role, user_id):
+    """操作人的过滤条件：房客是下订单的用户，房东是订单所属房屋的发布者"""
+    if role == GUEST:
+        return Order.user_id == user_id
+    return exists().where(and_(House.id == Order.house_id, House.user_id == user_id))
+
+
+def transition(order_id, action, user_id, **values):
+    """执行订单的状态流转，values是需要同时修改的其它字段(例如评价内容)
+    返回是否修改成功：订单不存在、状态不对或者用户没有权限时返回False
+    修改只在当前会话中执行，需要调用方提交
+    """
+    from_status, to_status, role = TRANSITIONS[action]
+    values['status'] = to_status
+    count = Order.query.filter(Order.id == order_id, Order.status == from_status, owner_filter(role, user_id)) \
+        .update(values, synchronize_session=False)
+    if count == 1 and to_status == 'COMPLETE':
+        increment_order_count(order_id)
+    return count == 1
+
+
+def increment_order_count(order_id):
+    """订单所属房屋的订单数加1：UPDATE ih_house_info SET order_count=order_count+1 WHERE id=(订单的房屋编号)
+    由数据库完成加1，不需要先读取订单数，同时完成的订单不会互相覆盖
+    """
+    house_id = db.session.query(Order.house_id).filter(Order.id == order_id).as_scalar()
+    House.query.filter(House.id == house_id) \
+        .update({'order_count': House.order_count + 1}, synchronize_session=False)
@@ -0,0 +1,39 @@
+# -*- coding:utf-8 -*-
+# 游标分页：把上一页最后一条数据的排序值编码成不透明的字符串，下一页从该位置继续查询
+
+
+import json
+import base64
+import datetime
+
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def encode_cursor(*values):
+    """将排序值编码为游标字符串，时间对象转成字符串保存"""
+    items = []
+    for value in values:
+        if isinstance(value, datetime.datetime):
+            items.append({'dt': value.strftime(DATETIME_FORMAT)})
+        else:
+            items.append(value)
+    cursor = base64.urlsafe_b64encode(json.dumps(items, separators=(',', ':')).encode('utf-8'))
+    # 去掉base64末尾的'='，放到URL里面不需要再转义
+    return cursor.decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """将游标字符串还原为排序值列表，游标不合法时抛出ValueError"""
+    try:
+        cursor = str(cursor)
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = []
+        for item in json.loads(data.decode('utf-8')):
+            if isinstance(item, dict):
+                values.append(datetime.datetime.strptime(item['dt'], DATETIME_FORMAT))
+            else:
+                values.append(item)
+    except Exception:
+        raise ValueError('invalid cursor: %r' % cursor)
+    return values
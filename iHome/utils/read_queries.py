@@ -0,0 +1,66 @@
+# -*- coding:utf-8 -*-
+# 列表接口的只读查询：使用SQLAlchemy Core的select直接得到查询结果行，不创建House/Order对象
+# 列表中的数据只用来序列化，不需要修改，ORM为每一行创建实体对象、登记到identity map、逐个属性读取的开销
+# 比SQL本身还要大；查询结果行按列名访问，交给House.basic_dict和Order.fields_dict生成和to_*_dict完全相同的数据
+# 房屋卡片(搜索、首页、我的房源)和订单列表使用这里的查询
+
+
+from iHome import db
+from iHome.models import Area, House, Order, User
+
+
+house_table = House.__table__
+order_table = Order.__table__
+
+
+def house_cards(house_ids):
+    """查询房屋的基本信息，返回 {房屋编号: 基本信息}，不存在的房屋不返回
+    房屋、城区的名字和房东的头像一条SQL查询
+    """
+    columns = [house_table.c[name] for name in House.BASIC_COLUMNS]
+    columns += [Area.__table__.c.name.label('area_name'), User.__table__.c.avatar_url.label('user_avatar_url')]
+    select = db.select(columns) \
+        .select_from(house_table.join(Area.__table__, house_table.c.area_id == Area.__table__.c.id)
+                     .join(User.__table__, house_table.c.user_id == User.__table__.c.id)) \
+        .where(house_table.c.id.in_(house_ids))
+    return dict((row.id, House.basic_dict(row, row.area_name, row.user_avatar_url))
+                for row in db.session.execute(select))
+
+
+def order_select(where, fields=None, limit=None):
+    """订单和订单房屋关联的查询语句，按订单编号倒序，只查询需要的字段使用的列
+    where: 订单和房屋关联后的筛选条件，可以使用订单表和房屋表的列
+    """
+    order_columns, house_columns = Order.dict_columns(fields)
+    # 房屋的编号和订单的编号同名，订单数据中不使用房屋的编号
+    columns = [order_table.c[name] for name in order_columns]
+    columns += [house_table.c[name] for name in house_columns if name != 'id']
+    select = db.select(columns) \
+        .select_from(order_table.join(house_table, order_table.c.house_id == house_table.c.id)) \
+        .where(where).order_by(order_table.c.id.desc())
+    if limit:
+        select = select.limit(limit)
+    return select
+
+
+def order_rows(where, fields=None, limit=None):
+    """查询订单和订单房屋的列，参数和order_select相同"""
+    return db.session.execute(order_select(where, fields, limit)).fetchall()
+
+
+def order_status_select(where):
+    """按订单状态分组统计订单数量的查询语句，where和order_select相同"""
+    return db.select([order_table.c.status, db.func.count(order_table.c.id)]) \
+        .select_from(order_table.join(house_table, order_table.c.house_id == house_table.c.id)) \
+        .where(where).group_by(order_table.c.status)
+
+
+def order_status_counts(where):
+    """各个状态的订单数量，返回 {订单状态: 数量}，没有订单的状态不返回"""
+    return dict(db.session.execute(order_status_select(where)).fetchall())
+
+
+def order_dicts(rows, fields=None):
+    """订单查询结果行转换为和Order.to_dict相同的字典数据，每一行同时包含订单和房屋的列"""
+    fields = fields or Order.DICT_FIELDS
+    return [Order.fields_dict(row, row, fields) for row in rows]
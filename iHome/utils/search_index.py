@@ -0,0 +1,168 @@
+# -*- coding:utf-8 -*-
+# 房屋关键词的倒排索引：房屋标题和地址切分成词，每个词使用一个redis集合保存包含它的房屋
+# 中文没有分隔符，连续的汉字切分成相邻两个字组成的词(二元组)，连续的字母、连续的数字取长度2~MAX_GRAM_LENGTH的所有子串，
+# 字母转为小写；关键词按同样的长度切分，包含所有词的房屋就是搜索结果，不需要对房屋表执行LIKE '%关键词%'全表扫描
+# 索引和LIKE查询的匹配规则相同：词作为子串出现在标题或者地址中，q=12也能搜到"112号"，q=lof也能搜到"loft"，
+# 匹配的数量较多、索引还没有生成时使用LIKE查询，结果不变
+# 集合的成员和房屋列表索引相同(补0的房屋编号)，不按日期筛选时直接与列表索引的有序集合求交集，
+# 结果按原来的排序值排好序，缓存一段时间供后续翻页使用
+# 索引需要先使用 python manage.py house rebuild_search 生成，生成之前调用方使用SQL查询
+
+
+import re
+import uuid
+import iHome
+from iHome import db, constants
+from iHome.models import House
+from iHome.utils import listing_index
+from iHome.utils.cache_generation import house_list_generation
+
+
+TOKEN_KEY = 'search:token:%s'
+RESULT_KEY = 'search:result:%s:%s:%s:%s'
+# 索引已经生成的标记，切分规则变化后修改标记的名字，重新生成索引之前使用SQL查询
+READY_KEY = 'search:ready:2'
+# 求交集时使用的临时key
+MATCHES_KEY = 'search:matches:%s'
+
+WORD_RE = re.compile(u'[a-z]+|[0-9]+|[\u4e00-\u9fff]+')
+# 连续的字母、数字建立索引的子串的最大长度，关键词中更长的部分按这个长度的子串搜索
+MAX_GRAM_LENGTH = 8
+
+
+def is_chinese(word):
+    return word[0] >= u'\u4e00'
+
+
+def grams(word, length):
+    """word中所有长度为length的子串"""
+    return set(word[i:i + length] for i in range(len(word) - length + 1))
+
+
+def tokenize(text):
+    """把文本切分成建立索引的词的集合：连续的汉字按二元组，连续的字母、连续的数字取长度2~MAX_GRAM_LENGTH的所有子串
+    单独的一个汉字、字母或数字不建立索引
+    """
+    tokens = set()
+    for word in WORD_RE.findall((text or u'').lower()):
+        if is_chinese(word):
+            tokens.update(grams(word, 2))
+        else:
+            for length in range(2, min(len(word), MAX_GRAM_LENGTH) + 1):
+                tokens.update(grams(word, length))
+    return tokens
+
+
+def house_tokens(house):
+    """房屋标题和地址中的词"""
+    return tokenize(house.title) | tokenize(house.address)
+
+
+def keyword_tokens(q):
+    """关键词切分成词，按顺序排列，作为缓存key的一部分
+    连续的汉字按二元组，连续的字母、数字整体作为一个词，超过MAX_GRAM_LENGTH时取这个长度的所有子串
+    单独的一个汉字、字母或数字没有建立索引，关键词中包含它们或者没有可以搜索的词时抛出ValueError
+    """
+    tokens = set()
+    for word in WORD_RE.findall(q.lower()):
+        if len(word) == 1:
+            raise ValueError('关键词中的汉字、字母或数字至少需要两个相连')
+        if is_chinese(word):
+            tokens.update(grams(word, 2))
+        else:
+            tokens.update(grams(word, min(len(word), MAX_GRAM_LENGTH)))
+    if not tokens:
+        raise ValueError('关键词中没有可以搜索的内容')
+    return sorted(tokens)
+
+
+def token_key(token):
+    return TOKEN_KEY % token
+
+
+def add_house(house, pipeline=None):
+    """把房屋加入各个词的集合，传入pipeline时由调用方执行"""
+    own_pipeline = pipeline is None
+    if own_pipeline:
+        pipeline = iHome.redis_store.pipeline(transaction=False)
+    for token in house_tokens(house):
+        pipeline.sadd(token_key(token), listing_index.member(house.id))
+    if own_pipeline:
+        pipeline.execute()
+
+
+def matching_house_ids(tokens, max_count):
+    """包含所有词的房屋编号，交集在redis中计算，不超过max_count个时才读取
+    索引还没有生成或者房屋数量超过max_count时返回None，由调用方使用LIKE查询
+    """
+    matches_key = MATCHES_KEY % uuid.uuid4().hex
+    pipeline = iHome.redis_store.pipeline()
+    pipeline.exists(READY_KEY)
+    pipeline.sinterstore(matches_key, [token_key(token) for token in tokens])
+    pipeline.expire(matches_key, 10)
+    ready, count, _ = pipeline.execute()
+    if not ready or count > max_count:
+        iHome.redis_store.delete(matches_key)
+        return None
+
+    pipeline = iHome.redis_store.pipeline()
+    pipeline.smembers(matches_key)
+    pipeline.delete(matches_key)
+    members, _ = pipeline.execute()
+    return [int(house_member) for house_member in members]
+
+
+def keyword_filter(tokens):
+    """索引不能使用时的SQL条件：每个词都作为子串出现在标题或者地址中，和索引的匹配规则相同，需要扫描房屋表"""
+    return db.and_(*[db.or_(House.title.contains(token), House.address.contains(token)) for token in tokens])
+
+
+def house_page(tokens, area_id, sk, p=1, cursor_values=None, capacity=1, excluded_ids=None):
+    """获取包含所有词的一页房屋编号，参数和返回值与listing_index.house_page相同
+    城区的有序集合和各个词的集合求交集，有序集合的权重为1，词集合的权重为0，交集中的分数就是原来的排序值
+    交集按城区的缓存版本号缓存，城区内的房屋变化后重新计算
+    """
+    field, _ = listing_index.SORT_FIELDS[sk]
+    key = RESULT_KEY % (area_id or listing_index.ALL_AREAS, house_list_generation(area_id), field, ','.join(tokens))
+
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    pipeline.exists(READY_KEY)
+    pipeline.exists(key)
+    ready, result_exists = pipeline.execute()
+    if not ready:
+        return None
+    if not result_exists:
+        weights = dict((token_key(token), 0) for token in tokens)
+        weights[listing_index.listing_key(area_id, field)] = 1
+        pipeline = iHome.redis_store.pipeline()
+        pipeline.zinterstore(key, weights)
+        pipeline.expire(key, constants.SEARCH_RESULT_REDIS_EXPIRES)
+        pipeline.execute()
+    return listing_index.key_page(key, sk, p, cursor_values, capacity, excluded_ids)
+
+
+def rebuild(batch_size=1000):
+    """根据房屋表重新生成整个索引，返回房屋数量
+    生成期间删除已经生成的标记，关键词搜索暂时使用SQL查询
+    """
+    iHome.redis_store.delete(READY_KEY)
+    for pattern in (TOKEN_KEY % '*', RESULT_KEY % ('*', '*', '*', '*')):
+        keys = []
+        for key in iHome.redis_store.scan_iter(pattern, count=batch_size):
+            keys.append(key)
+            if len(keys) == batch_size:
+                iHome.redis_store.delete(*keys)
+                keys = []
+        if keys:
+            iHome.redis_store.delete(*keys)
+
+    house_count = 0
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    for house in db.session.query(House.id, House.title, House.address).yield_per(batch_size):
+        add_house(house, pipeline)
+        house_count += 1
+        if house_count % batch_size == 0:
+            pipeline.execute()
+    pipeline.execute()
+    iHome.redis_store.set(READY_KEY, 1)
+    return house_count
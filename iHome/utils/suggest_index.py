@@ -0,0 +1,132 @@
+# -*- coding:utf-8 -*-
+# 搜索框输入提示的前缀索引：城区名字和房屋标题的每个前缀使用一个redis有序集合，
+# 成员是序列化好的提示内容 {"type": "area"/"house", "id": 编号, "text": 名字或标题}，分数是权重(订单数)
+# 标题按空格和标点分成几段，每段的前缀也建立索引，输入标题中间的一段也能得到提示
+# 每个有序集合只保留权重最高的几条，查询时一次ZREVRANGE，不需要访问数据库
+# 房屋的权重是房屋的订单数，城区的权重是城区内所有房屋的订单数之和
+# 索引需要先使用 python manage.py house rebuild_suggest 生成，发布房屋和订单完成时增量更新
+
+
+import re
+import iHome
+from iHome import db, constants
+from iHome.models import Area, House
+from iHome.utils.common import json_bytes
+
+
+PREFIX_KEY = 'suggest:prefix:%s'
+# 城区的名字和权重，订单完成时更新城区的权重使用
+AREA_NAME_KEY = 'suggest:area_name'
+AREA_WEIGHT_KEY = 'suggest:area_weight'
+
+SEGMENT_RE = re.compile(u'[\s,.;:!?/()\-，。；：！？、（）·]+', re.UNICODE)
+
+
+def prefixes(text):
+    """文本的前缀：整个文本和其中每一段，从第一个字开始，最长SUGGEST_PREFIX_MAX_LENGTH个字，字母转为小写"""
+    text = (text or u'').lower().strip()
+    result = set()
+    for segment in [text] + SEGMENT_RE.split(text):
+        segment = segment.strip()
+        for length in range(1, min(len(segment), constants.SUGGEST_PREFIX_MAX_LENGTH) + 1):
+            result.add(segment[:length])
+    return result
+
+
+def prefix_key(prefix):
+    return PREFIX_KEY % prefix
+
+
+def suggestion(kind, object_id, text):
+    """序列化好的提示内容，同时作为有序集合的成员"""
+    return json_bytes({'type': kind, 'id': object_id, 'text': text})
+
+
+def add(pipeline, member, text, weight):
+    """把提示加入文本的每个前缀，并删除每个前缀中排在SUGGEST_PREFIX_CAPACITY条之后的提示"""
+    keys = [prefix_key(prefix) for prefix in prefixes(text)]
+    for key in keys:
+        pipeline.zadd(key, weight, member)
+    for key in keys:
+        pipeline.zremrangebyrank(key, 0, -constants.SUGGEST_PREFIX_CAPACITY - 1)
+
+
+def add_house(house_id, title, order_count):
+    """发布房屋或者房屋的订单数变化后，按订单数加入或更新房屋的提示"""
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    add(pipeline, suggestion('house', house_id, title), title, order_count or 0)
+    pipeline.execute()
+
+
+def add_area(pipeline, area_id, name, weight):
+    """加入城区的提示，同时记录城区的名字和权重"""
+    pipeline.hset(AREA_NAME_KEY, area_id, name)
+    pipeline.hset(AREA_WEIGHT_KEY, area_id, weight)
+    add(pipeline, suggestion('area', area_id, name), name, weight)
+
+
+def increment_area(area_id):
+    """城区内的订单完成后，城区的权重加1"""
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    pipeline.hget(AREA_NAME_KEY, area_id)
+    pipeline.hincrby(AREA_WEIGHT_KEY, area_id, 1)
+    name, weight = pipeline.execute()
+    if name is None:
+        # 索引还没有生成
+        return
+    name = name.decode('utf-8')
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    add(pipeline, suggestion('area', area_id, name), name, weight)
+    pipeline.execute()
+
+
+def update_area_weight(area_id, weight):
+    """城区的订单数重新统计后，更新城区的权重"""
+    name = iHome.redis_store.hget(AREA_NAME_KEY, area_id)
+    if name is None:
+        # 索引还没有生成
+        return
+    name = name.decode('utf-8')
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    pipeline.hset(AREA_WEIGHT_KEY, area_id, weight)
+    add(pipeline, suggestion('area', area_id, name), name, weight)
+    pipeline.execute()
+
+
+def suggest(q, count):
+    """以q开头的提示，按权重从高到低，返回序列化好的JSON数组
+    q超过索引的最大前缀长度时按最大长度的前缀查找
+    """
+    q = q.lower().strip()[:constants.SUGGEST_PREFIX_MAX_LENGTH]
+    members = iHome.redis_store.zrevrange(prefix_key(q), 0, count - 1)
+    return b'[' + b','.join(members) + b']'
+
+
+def rebuild(batch_size=1000):
+    """根据城区表和房屋表重新生成整个索引，返回(城区数量, 房屋数量)
+    分批写入，每条提示写入后都会删除前缀中多余的提示，生成期间有序集合不会变得很大
+    """
+    keys = []
+    for key in iHome.redis_store.scan_iter('suggest:*', count=batch_size):
+        keys.append(key)
+        if len(keys) == batch_size:
+            iHome.redis_store.delete(*keys)
+            keys = []
+    if keys:
+        iHome.redis_store.delete(*keys)
+
+    area_weights = dict(db.session.query(House.area_id, db.func.sum(House.order_count)).group_by(House.area_id).all())
+    areas = Area.query.all()
+    pipeline = iHome.redis_store.pipeline(transaction=False)
+    for area in areas:
+        add_area(pipeline, area.id, area.name, int(area_weights.get(area.id) or 0))
+    pipeline.execute()
+
+    house_count = 0
+    for house in db.session.query(House.id, House.title, House.order_count).yield_per(batch_size):
+        add(pipeline, suggestion('house', house.id, house.title), house.title, house.order_count or 0)
+        house_count += 1
+        if house_count % batch_size == 0:
+            pipeline.execute()
+    pipeline.execute()
+    return len(areas), house_count
@@ -3,6 +3,7 @@ from flask_migrate import Migrate, MigrateCommand
 from flask_script import Manager
 from iHome import get_app, db
 from iHome import models  # 对表进行迁移
+from iHome.commands import CacheCommand, AvailabilityCommand, HouseCommand
 
 
 # 创建app
@@ -16,6 +17,12 @@ manager = Manager(app)
 Migrate(app, db)
 # 将数据库迁移脚本添加到脚本管理器中
 manager.add_command('db', MigrateCommand)
+# 缓存管理命令，例如：python manage.py cache report
+manager.add_command('cache', CacheCommand)
+# 预订日历索引管理命令，例如：python manage.py availability rebuild
+manager.add_command('availability', AvailabilityCommand)
+# 房屋数据维护命令，例如：python manage.py house backfill_order_count
+manager.add_command('house', HouseCommand)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,40 @@
+"""add indexes for search, booking and order listing queries
+
+Revision ID: 3b7c2f91d0a4
+Revises: e199b43c386e
+Create Date: 2018-04-20 10:12:31.518205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7c2f91d0a4'
+down_revision = 'e199b43c386e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_ih_house_info_area_id_create_time', 'ih_house_info', ['area_id', 'create_time'], unique=False)
+    op.create_index('ix_ih_house_info_area_id_price', 'ih_house_info', ['area_id', 'price'], unique=False)
+    op.create_index('ix_ih_house_info_area_id_order_count', 'ih_house_info', ['area_id', 'order_count'], unique=False)
+    op.create_index('ix_ih_house_info_create_time', 'ih_house_info', ['create_time'], unique=False)
+    op.create_index(op.f('ix_ih_house_info_price'), 'ih_house_info', ['price'], unique=False)
+    op.create_index(op.f('ix_ih_house_info_order_count'), 'ih_house_info', ['order_count'], unique=False)
+    op.create_index(op.f('ix_ih_house_info_user_id'), 'ih_house_info', ['user_id'], unique=False)
+    op.create_index('ix_ih_order_info_house_id_dates', 'ih_order_info', ['house_id', 'begin_date', 'end_date'], unique=False)
+    op.create_index(op.f('ix_ih_order_info_user_id'), 'ih_order_info', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ih_order_info_user_id'), table_name='ih_order_info')
+    op.drop_index('ix_ih_order_info_house_id_dates', table_name='ih_order_info')
+    op.drop_index(op.f('ix_ih_house_info_user_id'), table_name='ih_house_info')
+    op.drop_index(op.f('ix_ih_house_info_order_count'), table_name='ih_house_info')
+    op.drop_index(op.f('ix_ih_house_info_price'), table_name='ih_house_info')
+    op.drop_index('ix_ih_house_info_create_time', table_name='ih_house_info')
+    op.drop_index('ix_ih_house_info_area_id_order_count', table_name='ih_house_info')
+    op.drop_index('ix_ih_house_info_area_id_price', table_name='ih_house_info')
+    op.drop_index('ix_ih_house_info_area_id_create_time', table_name='ih_house_info')
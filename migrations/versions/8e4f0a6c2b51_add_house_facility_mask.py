@@ -0,0 +1,32 @@
+"""add facility bitmask to ih_house_info
+
+Revision ID: 8e4f0a6c2b51
+Revises: 3b7c2f91d0a4
+Create Date: 2018-04-27 15:36:08.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4f0a6c2b51'
+down_revision = '3b7c2f91d0a4'
+branch_labels = None
+depends_on = None
+
+
+# bit n of facility_mask is facility n, the column is a signed 64-bit integer (see iHome/utils/facets.py)
+MAX_FACILITY_ID = 62
+
+
+def upgrade():
+    max_facility_id = op.get_bind().execute(sa.text('SELECT MAX(id) FROM ih_facility_info')).scalar() or 0
+    if max_facility_id > MAX_FACILITY_ID:
+        raise Exception('facility id %d does not fit in facility_mask (max %d)' % (max_facility_id, MAX_FACILITY_ID))
+    # existing houses start at 0, run "python manage.py house backfill_facility_mask" afterwards
+    op.add_column('ih_house_info', sa.Column('facility_mask', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('ih_house_info', 'facility_mask')